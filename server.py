@@ -8,13 +8,21 @@ Designed to be populated by Claude as it learns about UE.
 import asyncio
 import json
 import sqlite3
+from array import array
+from collections import OrderedDict
 from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
 
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import TextContent, Tool
 
+try:
+    import orjson
+except ImportError:  # optional speedup; stdlib json is the fallback
+    orjson = None
+
 # ── Database ──────────────────────────────────────────────────────────────────
 
 DB_PATH = Path.home() / ".ue-knowledge" / "knowledge.db"
@@ -46,7 +54,11 @@ CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
     VALUES (new.id, new.title, new.subsystem, new.category, new.summary, new.content, new.tags);
 END;
 
-CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries BEGIN
+CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries
+    WHEN old.title IS NOT new.title OR old.subsystem IS NOT new.subsystem
+      OR old.category IS NOT new.category OR old.summary IS NOT new.summary
+      OR old.content IS NOT new.content OR old.tags IS NOT new.tags
+BEGIN
     INSERT INTO entries_fts(entries_fts, rowid, title, subsystem, category, summary, content, tags)
     VALUES ('delete', old.id, old.title, old.subsystem, old.category, old.summary, old.content, old.tags);
     INSERT INTO entries_fts(rowid, title, subsystem, category, summary, content, tags)
@@ -58,9 +70,23 @@ CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
     VALUES ('delete', old.id, old.title, old.subsystem, old.category, old.summary, old.content, old.tags);
 END;
 
+-- Row counters kept by triggers, so unfiltered totals skip COUNT(*) scans
+CREATE TABLE IF NOT EXISTS row_counts (
+    tbl TEXT PRIMARY KEY,
+    n INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO row_counts (tbl, n) VALUES ('entries', 0);
+
+CREATE TRIGGER IF NOT EXISTS entries_count_ai AFTER INSERT ON entries BEGIN
+    UPDATE row_counts SET n = n + 1 WHERE tbl = 'entries';
+END;
+
+CREATE TRIGGER IF NOT EXISTS entries_count_ad AFTER DELETE ON entries BEGIN
+    UPDATE row_counts SET n = n - 1 WHERE tbl = 'entries';
+END;
+
 CREATE INDEX IF NOT EXISTS idx_entries_subsystem ON entries(subsystem);
 CREATE INDEX IF NOT EXISTS idx_entries_category ON entries(category);
-CREATE INDEX IF NOT EXISTS idx_entries_updated ON entries(updated_at DESC);
 
 -- ── Structured code tables ──────────────────────────────────────────────────
 
@@ -109,7 +135,13 @@ CREATE TRIGGER IF NOT EXISTS classes_ai AFTER INSERT ON classes BEGIN
     INSERT INTO classes_fts(rowid, name, parent_class, summary, doc_comment, module, lifecycle_order, key_methods, key_properties, key_delegates)
     VALUES (new.id, new.name, new.parent_class, new.summary, new.doc_comment, new.module, new.lifecycle_order, new.key_methods, new.key_properties, new.key_delegates);
 END;
-CREATE TRIGGER IF NOT EXISTS classes_au AFTER UPDATE ON classes BEGIN
+CREATE TRIGGER IF NOT EXISTS classes_au AFTER UPDATE ON classes
+    WHEN old.name IS NOT new.name OR old.parent_class IS NOT new.parent_class
+      OR old.summary IS NOT new.summary OR old.doc_comment IS NOT new.doc_comment
+      OR old.module IS NOT new.module OR old.lifecycle_order IS NOT new.lifecycle_order
+      OR old.key_methods IS NOT new.key_methods OR old.key_properties IS NOT new.key_properties
+      OR old.key_delegates IS NOT new.key_delegates
+BEGIN
     INSERT INTO classes_fts(classes_fts, rowid, name, parent_class, summary, doc_comment, module, lifecycle_order, key_methods, key_properties, key_delegates)
     VALUES ('delete', old.id, old.name, old.parent_class, old.summary, old.doc_comment, old.module, old.lifecycle_order, old.key_methods, old.key_properties, old.key_delegates);
     INSERT INTO classes_fts(rowid, name, parent_class, summary, doc_comment, module, lifecycle_order, key_methods, key_properties, key_delegates)
@@ -220,7 +252,11 @@ CREATE TRIGGER IF NOT EXISTS functions_ai AFTER INSERT ON functions BEGIN
     INSERT INTO functions_fts(rowid, name, qualified_name, class_name, summary, doc_comment, call_context)
     VALUES (new.id, new.name, new.qualified_name, new.class_name, new.summary, new.doc_comment, new.call_context);
 END;
-CREATE TRIGGER IF NOT EXISTS functions_au AFTER UPDATE ON functions BEGIN
+CREATE TRIGGER IF NOT EXISTS functions_au AFTER UPDATE ON functions
+    WHEN old.name IS NOT new.name OR old.qualified_name IS NOT new.qualified_name
+      OR old.class_name IS NOT new.class_name OR old.summary IS NOT new.summary
+      OR old.doc_comment IS NOT new.doc_comment OR old.call_context IS NOT new.call_context
+BEGIN
     INSERT INTO functions_fts(functions_fts, rowid, name, qualified_name, class_name, summary, doc_comment, call_context)
     VALUES ('delete', old.id, old.name, old.qualified_name, old.class_name, old.summary, old.doc_comment, old.call_context);
     INSERT INTO functions_fts(rowid, name, qualified_name, class_name, summary, doc_comment, call_context)
@@ -243,7 +279,11 @@ CREATE TRIGGER IF NOT EXISTS properties_ai AFTER INSERT ON properties BEGIN
     INSERT INTO properties_fts(rowid, name, qualified_name, class_name, summary, doc_comment, property_type)
     VALUES (new.id, new.name, new.qualified_name, new.class_name, new.summary, new.doc_comment, new.property_type);
 END;
-CREATE TRIGGER IF NOT EXISTS properties_au AFTER UPDATE ON properties BEGIN
+CREATE TRIGGER IF NOT EXISTS properties_au AFTER UPDATE ON properties
+    WHEN old.name IS NOT new.name OR old.qualified_name IS NOT new.qualified_name
+      OR old.class_name IS NOT new.class_name OR old.summary IS NOT new.summary
+      OR old.doc_comment IS NOT new.doc_comment OR old.property_type IS NOT new.property_type
+BEGIN
     INSERT INTO properties_fts(properties_fts, rowid, name, qualified_name, class_name, summary, doc_comment, property_type)
     VALUES ('delete', old.id, old.name, old.qualified_name, old.class_name, old.summary, old.doc_comment, old.property_type);
     INSERT INTO properties_fts(rowid, name, qualified_name, class_name, summary, doc_comment, property_type)
@@ -255,6 +295,24 @@ CREATE TRIGGER IF NOT EXISTS properties_ad AFTER DELETE ON properties BEGIN
 END;
 """
 
+# sqlite3 keeps prepared statements per connection keyed by SQL text. Hot
+# queries are built from fixed templates, so every filter/column variant gets
+# its own slot; sized well above the number of distinct statements we issue.
+STATEMENT_CACHE_SIZE = 256
+
+# Max search/search_all results kept per KnowledgeDB (LRU).
+RESULT_CACHE_SIZE = 256
+
+# Per-connection tuning. The database may be opened by several MCP server
+# processes at once, so locking stays NORMAL and the journal stays WAL;
+# synchronous=NORMAL is the durable-enough pairing for WAL.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+
 VALID_SUBSYSTEMS = [
     "core", "gameplay", "gas", "rendering", "networking", "ui",
     "input", "animation", "ai", "physics", "audio", "editor",
@@ -268,8 +326,167 @@ VALID_CATEGORIES = [
 ]
 
 VALID_KINDS = ["class", "struct", "enum", "interface"]
+# Membership checks use these; the lists above keep display and schema order
+SUBSYSTEM_SET = frozenset(VALID_SUBSYSTEMS)
+CATEGORY_SET = frozenset(VALID_CATEGORIES)
+KIND_SET = frozenset(VALID_KINDS)
 DEPTH_ORDER = {"stub": 0, "shallow": 1, "deep": 2}
 
+CLASS_SIMPLE_FIELDS = ("parent_class", "outer_class", "class_specifiers", "doc_comment",
+                       "summary", "lifecycle_order", "entry_id", "source_line_count")
+CLASS_ARRAY_FIELDS = ("inheritance_chain", "known_children", "interfaces",
+                      "key_methods", "key_properties", "key_delegates", "related_classes")
+ENTRY_ARRAY_FIELDS = ("source_files", "tags", "related_entries")
+
+
+def _depth_rank_sql(column):
+    whens = " ".join(f"WHEN '{depth}' THEN {rank}" for depth, rank in DEPTH_ORDER.items())
+    return f"(CASE {column} {whens} ELSE 0 END)"
+
+
+# Columns list_entries returns; all covered by idx_entries_list so paging
+# never reads the content pages
+LIST_COLUMNS = "id, title, subsystem, category, summary, tags, updated_at"
+
+_INSERT_ENTRY_SQL = """
+    INSERT INTO entries
+        (title, subsystem, category, summary, content,
+         source_files, tags, related_entries, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+_INSERT_ENTRY_UNLESS_DUPLICATE_SQL = _INSERT_ENTRY_SQL + "ON CONFLICT(title) DO NOTHING RETURNING id"
+
+
+# Class update assignments for an existing row: JSON arrays are merged by the
+# merge_json_arrays SQL function, simple fields only change when supplied and
+# non-empty, and analysis_depth only ever upgrades.
+_SAVE_CLASS_UPDATES = (
+    *((f, f":{f}") for f in ("kind", "subsystem", "module", "header_path")),
+    *((f, f"COALESCE(NULLIF(:new_{f}, ''), classes.{f})") for f in CLASS_SIMPLE_FIELDS),
+    *((f, f"merge_json_arrays(classes.{f}, :{f})") for f in CLASS_ARRAY_FIELDS),
+    ("analysis_depth", f"""CASE
+            WHEN {_depth_rank_sql(":analysis_depth")} > {_depth_rank_sql("classes.analysis_depth")}
+            THEN :analysis_depth ELSE classes.analysis_depth END"""),
+)
+
+# Class save, as two statements run by KnowledgeDB._upsert: the INSERT returns
+# an id only when it created the row; otherwise the UPDATE returns one only
+# when some column would change, so a no-op resave writes nothing (no journal,
+# triggers or updated_at bump).
+_INSERT_CLASS_SQL = """
+    INSERT INTO classes
+        (name, kind, parent_class, outer_class, subsystem, module, header_path,
+         class_specifiers, doc_comment, summary,
+         inheritance_chain, known_children, interfaces,
+         key_methods, key_properties, key_delegates,
+         lifecycle_order, related_classes, entry_id,
+         analysis_depth, source_line_count, created_at, updated_at)
+    VALUES
+        (:name, :kind, :parent_class, :outer_class, :subsystem, :module, :header_path,
+         :class_specifiers, :doc_comment, :summary,
+         :inheritance_chain, :known_children, :interfaces,
+         :key_methods, :key_properties, :key_delegates,
+         :lifecycle_order, :related_classes, :entry_id,
+         :analysis_depth, :source_line_count, :now, :now)
+    ON CONFLICT(name) DO NOTHING
+    RETURNING id
+"""
+_UPDATE_CLASS_SQL = f"""
+    UPDATE classes SET
+        {", ".join(f"{f} = {expr}" for f, expr in _SAVE_CLASS_UPDATES)},
+        updated_at = :now
+    WHERE name = :name
+      AND ({" OR ".join(f"classes.{f} IS NOT ({expr})" for f, expr in _SAVE_CLASS_UPDATES)})
+    RETURNING id
+"""
+
+
+def _fts_hits_cte(fts_table, top_k=False):
+    """WITH clause binding one MATCH parameter. MATERIALIZED keeps the FTS index
+    driving the query even when the outer SELECT adds filters on the base table.
+    With top_k it also binds a LIMIT, so FTS5 keeps only the best-ranked rows
+    instead of materializing every hit; only valid with no base-table filter."""
+    order = " ORDER BY rank LIMIT ?" if top_k else ""
+    return f"WITH hits AS MATERIALIZED (SELECT rowid, rank FROM {fts_table} WHERE {fts_table} MATCH ?{order})"
+
+
+# search_all result columns per table: (alias, select list)
+SEARCH_ALL_COLUMNS = {
+    "entries": ("e", "e.id, e.title, e.subsystem, e.category, e.summary, e.tags"),
+    "classes": ("c", "c.id, c.name, c.kind, c.subsystem, c.module, c.summary"),
+    "functions": ("f", "f.id, f.name, f.qualified_name, f.class_name, f.subsystem, "
+                       "f.summary, f.is_virtual, f.is_blueprint_callable"),
+    "properties": ("p", "p.id, p.name, p.qualified_name, p.class_name, p.subsystem, "
+                        "p.property_type, p.summary"),
+}
+
+
+# query_calls columns per direction: only the call lists it will return are read
+_CALLS_BASE_COLUMNS = "qualified_name, summary, call_context, call_order"
+_CALLS_COLUMNS = {
+    "callees": f"{_CALLS_BASE_COLUMNS}, calls_into",
+    "callers": f"{_CALLS_BASE_COLUMNS}, called_by",
+    "both": f"{_CALLS_BASE_COLUMNS}, calls_into, called_by",
+}
+
+
+# Ancestor chain nearest-first, at most `depth` hops, in one statement. The last
+# parent is reported even when it has no row of its own (e.g. UObject stubs).
+_PARENTS_SQL = """
+    WITH RECURSIVE chain(name, depth) AS (
+        SELECT parent_class, 1 FROM classes WHERE name = ?
+        UNION ALL
+        SELECT c.parent_class, chain.depth + 1
+        FROM chain JOIN classes c ON c.name = chain.name
+        WHERE chain.depth < ?
+    )
+    SELECT name FROM chain WHERE depth <= ? AND name IS NOT NULL AND name != '' ORDER BY depth
+"""
+
+
+# Bounded breadth-first descendant walk: per-parent fan-out, depth and the
+# overall node budget (+1 for the root row) are all enforced by SQLite.
+_CHILDREN_SQL = """
+    WITH RECURSIVE tree(name, parent, depth) AS (
+        SELECT ?, NULL, 0
+        UNION ALL
+        SELECT c.name, tree.name, tree.depth + 1
+        FROM tree JOIN classes c ON c.id IN (
+            SELECT id FROM classes WHERE parent_class = tree.name LIMIT ?)
+        WHERE tree.depth < ?
+        LIMIT ?
+    )
+    SELECT name, parent, depth FROM tree WHERE depth > 0
+"""
+
+
+@lru_cache(maxsize=None)
+def _upsert_sql(table, columns, key):
+    """(insert, update) statements for KnowledgeDB._upsert, binding named
+    parameters per column. The insert does nothing on a key conflict; the
+    update overwrites every column but created_at, and returns no row when
+    only updated_at would change."""
+    insert = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(f':{c}' for c in columns)}) "
+        f"ON CONFLICT({key}) DO NOTHING RETURNING id"
+    )
+    updates = ", ".join(f"{c} = :{c}" for c in columns if c != "created_at")
+    changed = " OR ".join(
+        f"{c} IS NOT :{c}" for c in columns if c not in ("created_at", "updated_at")
+    )
+    update = f"UPDATE {table} SET {updates} WHERE {key} = :{key} AND ({changed}) RETURNING id"
+    return insert, update
+
+
+@lru_cache(maxsize=None)
+def _analysis_breakdown_sql(col, by_module, by_subsystem):
+    """analysis_status breakdown query, built once per grouping/filter combination."""
+    wheres = [w for w, on in (("module = ?", by_module), ("subsystem = ?", by_subsystem)) if on]
+    where = f" WHERE {' AND '.join(wheres)}" if wheres else ""
+    return (f"SELECT {col}, analysis_depth, COUNT(*) as cnt FROM analysis_log{where} "
+            f"GROUP BY {col}, analysis_depth ORDER BY {col}")
+
+
 # Migrations for upgrading existing databases. Each: (version, description, [sql])
 MIGRATIONS = [
     (1, "Add indexes on entry_id columns", [
@@ -340,9 +557,118 @@ MIGRATIONS = [
         END""",
         "INSERT INTO classes_fts(classes_fts) VALUES('rebuild')",
     ]),
+    (4, "Skip FTS reindex when function/property upserts leave indexed columns unchanged", [
+        "DROP TRIGGER IF EXISTS functions_au",
+        "DROP TRIGGER IF EXISTS properties_au",
+        """CREATE TRIGGER IF NOT EXISTS functions_au AFTER UPDATE ON functions
+            WHEN old.name IS NOT new.name OR old.qualified_name IS NOT new.qualified_name
+              OR old.class_name IS NOT new.class_name OR old.summary IS NOT new.summary
+              OR old.doc_comment IS NOT new.doc_comment OR old.call_context IS NOT new.call_context
+        BEGIN
+            INSERT INTO functions_fts(functions_fts, rowid, name, qualified_name, class_name, summary, doc_comment, call_context)
+            VALUES ('delete', old.id, old.name, old.qualified_name, old.class_name, old.summary, old.doc_comment, old.call_context);
+            INSERT INTO functions_fts(rowid, name, qualified_name, class_name, summary, doc_comment, call_context)
+            VALUES (new.id, new.name, new.qualified_name, new.class_name, new.summary, new.doc_comment, new.call_context);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS properties_au AFTER UPDATE ON properties
+            WHEN old.name IS NOT new.name OR old.qualified_name IS NOT new.qualified_name
+              OR old.class_name IS NOT new.class_name OR old.summary IS NOT new.summary
+              OR old.doc_comment IS NOT new.doc_comment OR old.property_type IS NOT new.property_type
+        BEGIN
+            INSERT INTO properties_fts(properties_fts, rowid, name, qualified_name, class_name, summary, doc_comment, property_type)
+            VALUES ('delete', old.id, old.name, old.qualified_name, old.class_name, old.summary, old.doc_comment, old.property_type);
+            INSERT INTO properties_fts(rowid, name, qualified_name, class_name, summary, doc_comment, property_type)
+            VALUES (new.id, new.name, new.qualified_name, new.class_name, new.summary, new.doc_comment, new.property_type);
+        END""",
+    ]),
+    (5, "Track entries row count in row_counts", [
+        """CREATE TABLE IF NOT EXISTS row_counts (
+            tbl TEXT PRIMARY KEY, n INTEGER NOT NULL DEFAULT 0)""",
+        """CREATE TRIGGER IF NOT EXISTS entries_count_ai AFTER INSERT ON entries BEGIN
+            UPDATE row_counts SET n = n + 1 WHERE tbl = 'entries';
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS entries_count_ad AFTER DELETE ON entries BEGIN
+            UPDATE row_counts SET n = n - 1 WHERE tbl = 'entries';
+        END""",
+        "INSERT OR REPLACE INTO row_counts (tbl, n) SELECT 'entries', COUNT(*) FROM entries",
+    ]),
+    (6, "Covering index for list_entries pages", [
+        "DROP INDEX IF EXISTS idx_entries_updated",
+        """CREATE INDEX IF NOT EXISTS idx_entries_list ON entries(
+            updated_at DESC, id, title, subsystem, category, summary, tags)""",
+    ]),
+    (7, "Skip FTS reindex when entry/class updates leave indexed columns unchanged", [
+        "DROP TRIGGER IF EXISTS entries_au",
+        "DROP TRIGGER IF EXISTS classes_au",
+        """CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries
+            WHEN old.title IS NOT new.title OR old.subsystem IS NOT new.subsystem
+              OR old.category IS NOT new.category OR old.summary IS NOT new.summary
+              OR old.content IS NOT new.content OR old.tags IS NOT new.tags
+        BEGIN
+            INSERT INTO entries_fts(entries_fts, rowid, title, subsystem, category, summary, content, tags)
+            VALUES ('delete', old.id, old.title, old.subsystem, old.category, old.summary, old.content, old.tags);
+            INSERT INTO entries_fts(rowid, title, subsystem, category, summary, content, tags)
+            VALUES (new.id, new.title, new.subsystem, new.category, new.summary, new.content, new.tags);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS classes_au AFTER UPDATE ON classes
+            WHEN old.name IS NOT new.name OR old.parent_class IS NOT new.parent_class
+              OR old.summary IS NOT new.summary OR old.doc_comment IS NOT new.doc_comment
+              OR old.module IS NOT new.module OR old.lifecycle_order IS NOT new.lifecycle_order
+              OR old.key_methods IS NOT new.key_methods OR old.key_properties IS NOT new.key_properties
+              OR old.key_delegates IS NOT new.key_delegates
+        BEGIN
+            INSERT INTO classes_fts(classes_fts, rowid, name, parent_class, summary, doc_comment, module, lifecycle_order, key_methods, key_properties, key_delegates)
+            VALUES ('delete', old.id, old.name, old.parent_class, old.summary, old.doc_comment, old.module, old.lifecycle_order, old.key_methods, old.key_properties, old.key_delegates);
+            INSERT INTO classes_fts(rowid, name, parent_class, summary, doc_comment, module, lifecycle_order, key_methods, key_properties, key_delegates)
+            VALUES (new.id, new.name, new.parent_class, new.summary, new.doc_comment, new.module, new.lifecycle_order, new.key_methods, new.key_properties, new.key_delegates);
+        END""",
+    ]),
+    (8, "Gather planner statistics", [
+        "ANALYZE",
+    ]),
+    (9, "Unique index on entries.title", [
+        # Titles duplicated through update() before this index get an id suffix
+        """UPDATE entries SET title = title || ' (' || id || ')'
+            WHERE id NOT IN (SELECT MIN(id) FROM entries GROUP BY title)""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_title ON entries(title)",
+    ]),
+    (10, "Track structured-table row counts in row_counts", [
+        f"""CREATE TRIGGER IF NOT EXISTS {tbl}_count_{suffix} AFTER {event} ON {tbl} BEGIN
+            UPDATE row_counts SET n = n {op} 1 WHERE tbl = '{tbl}';
+        END"""
+        for tbl in ("classes", "functions", "properties", "analysis_log")
+        for suffix, event, op in (("ai", "INSERT", "+"), ("ad", "DELETE", "-"))
+    ] + [
+        f"INSERT OR REPLACE INTO row_counts (tbl, n) SELECT '{tbl}', COUNT(*) FROM {tbl}"
+        for tbl in ("classes", "functions", "properties", "analysis_log")
+    ]),
+    (11, "Rewrite JSON array columns in the compact form _json_dumps writes", [
+        # Rows written by json.dumps' default '["a", "b"]' would otherwise never
+        # compare equal to a fresh '["a","b"]' in the no-op save guards
+        f"UPDATE {tbl} SET {', '.join(f'{c} = json_compact({c})' for c in cols)} "
+        f"WHERE {' OR '.join(f'{c} IS NOT json_compact({c})' for c in cols)}"
+        for tbl, cols in (
+            ("entries", ENTRY_ARRAY_FIELDS),
+            ("classes", CLASS_ARRAY_FIELDS),
+            ("functions", ("parameters", "calls_into", "called_by")),
+        )
+    ]),
 ]
 
 
+if orjson is not None:
+    def _json_dumps(value):
+        return orjson.dumps(value).decode()
+
+    _json_loads = orjson.loads
+else:
+    # Same text as orjson: no whitespace, non-ASCII kept as-is
+    def _json_dumps(value):
+        return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+    _json_loads = json.loads
+
+
 def _safe_json_loads(value, default=None):
     """Parse JSON string with fallback. Returns default ([] if not specified) on failure."""
     if default is None:
@@ -350,25 +676,94 @@ def _safe_json_loads(value, default=None):
     if not value:
         return default
     try:
-        result = json.loads(value)
+        result = _json_loads(value)
         return result if isinstance(result, (list, dict)) else default
-    except (json.JSONDecodeError, TypeError):
+    except (ValueError, TypeError):
         return default
 
 
+def _merge_json_arrays_sql(old_json, new_json):
+    """SQL merge_json_arrays(old, new): append items of new that old lacks."""
+    new = _safe_json_loads(new_json)
+    if not new:
+        return old_json
+    return KnowledgeDB._merge_json_arrays(old_json, new)
+
+
+def _json_compact_sql(value):
+    """SQL json_compact(text): JSON text re-serialized by _json_dumps; NULL and
+    non-JSON text come back unchanged."""
+    if value is None:
+        return None
+    try:
+        return _json_dumps(_json_loads(value))
+    except (TypeError, ValueError):
+        return value
+
+
 class KnowledgeDB:
-    def __init__(self):
-        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(str(DB_PATH))
-        self.conn.execute("PRAGMA journal_mode=WAL")
+    def __init__(self, path=None, template=None):
+        """Open the knowledge DB at path (default DB_PATH). ":memory:" gives a
+        private in-memory database, used by the test suite. With template (an
+        open KnowledgeDB) its pages are copied in via the backup API instead
+        of replaying SCHEMA and the migrations."""
+        path = DB_PATH if path is None else path
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), cached_statements=STATEMENT_CACHE_SIZE)
+        if template is not None:
+            template.conn.backup(self.conn)
+        if path != ":memory:":
+            # In-memory databases only support the "memory" journal mode
+            self.conn.execute("PRAGMA journal_mode=WAL")
         self.conn.execute("PRAGMA foreign_keys=ON")
+        for pragma in CONNECTION_PRAGMAS:
+            self.conn.execute(pragma)
         self.conn.row_factory = sqlite3.Row
-        self.conn.executescript(SCHEMA)
-        self._run_migrations()
+        self.conn.create_function("merge_json_arrays", 2, _merge_json_arrays_sql, deterministic=True)
+        self.conn.create_function("json_compact", 1, _json_compact_sql, deterministic=True)
+        if template is None:
+            self.conn.executescript(SCHEMA)
+            self._run_migrations()
+        # save_batch item type -> bound saver, resolved once instead of per item
+        self._batch_savers = {
+            "class": self.save_class,
+            "function": self.save_function,
+            "property": self.save_property,
+        }
+        self._result_cache = OrderedDict()
+        self._result_cache_version = None
 
     def close(self):
+        # Refresh planner statistics for tables this connection queried
+        try:
+            self.conn.execute("PRAGMA optimize")
+        except sqlite3.ProgrammingError:
+            return  # already closed
         self.conn.close()
 
+    # ── Search result cache ───────────────────────────────────────────────────
+
+    def _cache_get(self, key):
+        """Cached search result for key, or None. The cache is dropped whenever
+        this connection has written (total_changes) or another connection has
+        committed (data_version) since it was filled."""
+        version = (self.conn.total_changes,
+                   self.conn.execute("PRAGMA data_version").fetchone()[0])
+        if version != self._result_cache_version:
+            self._result_cache.clear()
+            self._result_cache_version = version
+            return None
+        hit = self._result_cache.get(key)
+        if hit is not None:
+            self._result_cache.move_to_end(key)
+        return hit
+
+    def _cache_put(self, key, value):
+        self._result_cache[key] = value
+        if len(self._result_cache) > RESULT_CACHE_SIZE:
+            self._result_cache.popitem(last=False)
+
     def _current_schema_version(self):
         try:
             row = self.conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
@@ -428,33 +823,58 @@ class KnowledgeDB:
         ).fetchone()
         return dict(row) if row else None
 
-    def save(self, title, subsystem, category, summary, content,
-             source_files=None, tags=None, related_entries=None):
-        if subsystem not in VALID_SUBSYSTEMS:
+    def _entry_row(self, title, subsystem, category, summary, content,
+                   source_files=None, tags=None, related_entries=None, *, now):
+        """Validate save() arguments and build the INSERT parameter tuple."""
+        if subsystem not in SUBSYSTEM_SET:
             raise ValueError(f"Invalid subsystem: '{subsystem}'. Valid: {', '.join(VALID_SUBSYSTEMS)}")
-        if category not in VALID_CATEGORIES:
+        if category not in CATEGORY_SET:
             raise ValueError(f"Invalid category: '{category}'. Valid: {', '.join(VALID_CATEGORIES)}")
+        return (
+            title, subsystem, category, summary, content,
+            _json_dumps(source_files or []),
+            _json_dumps(self._normalize_tags(tags)),
+            _json_dumps(related_entries or []),
+            now, now,
+        )
 
-        duplicate = self._check_duplicate(title)
-        if duplicate:
+    def save(self, title, subsystem, category, summary, content,
+             source_files=None, tags=None, related_entries=None):
+        now = datetime.now(timezone.utc).isoformat()
+        row = self._entry_row(title, subsystem, category, summary, content,
+                              source_files, tags, related_entries, now=now)
+
+        # idx_entries_title turns a duplicate into a no-op insert, so the lookup
+        # only runs when there is one
+        inserted = self.conn.execute(_INSERT_ENTRY_UNLESS_DUPLICATE_SQL, row).fetchone()
+        self.conn.commit()
+        if inserted is None:
+            duplicate = self._check_duplicate(title)
             return {"duplicate": True, "existing_id": duplicate["id"], "title": duplicate["title"]}
+        return inserted[0]
 
+    def save_many(self, entries):
+        """Save many entries in a single transaction with one prepared insert.
+        Each entry: dict of save() arguments. Invalid entries and duplicate
+        titles (in the batch or already stored, as idx_entries_title reports
+        them) are listed in errors by index; the rest are inserted."""
         now = datetime.now(timezone.utc).isoformat()
-        cursor = self.conn.execute(
-            """INSERT INTO entries
-               (title, subsystem, category, summary, content,
-                source_files, tags, related_entries, created_at, updated_at)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (
-                title, subsystem, category, summary, content,
-                json.dumps(source_files or []),
-                json.dumps(self._normalize_tags(tags)),
-                json.dumps(related_entries or []),
-                now, now,
-            ),
-        )
-        self.conn.commit()
-        return cursor.lastrowid
+        rows = []
+        errors = []
+        for i, entry in enumerate(entries):
+            try:
+                rows.append((i, self._entry_row(now=now, **entry)))
+            except (TypeError, ValueError) as e:
+                errors.append({"index": i, "error": str(e)})
+        saved = 0
+        with self.conn:
+            for i, row in rows:
+                if self.conn.execute(_INSERT_ENTRY_UNLESS_DUPLICATE_SQL, row).fetchone() is None:
+                    errors.append({"index": i, "error": f"Duplicate title: '{row[0]}'"})
+                else:
+                    saved += 1
+        errors.sort(key=lambda e: e["index"])
+        return {"saved": saved, "errors": errors}
 
     def search(self, query, limit=10, subsystem=None, category=None, tags=None):
         terms = [t.replace('"', '').strip() for t in query.strip().split()]
@@ -462,8 +882,13 @@ class KnowledgeDB:
         if not terms:
             return [], 0
         fts_query = " OR ".join(f'"{t}"*' for t in terms)
+        key = ("search", fts_query, limit, subsystem, category, tuple(tags or ()))
+        hit = self._cache_get(key)
+        if hit is not None:
+            rows, total = hit
+            return [dict(r) for r in rows], total
 
-        where = "WHERE entries_fts MATCH ?"
+        where = "WHERE 1=1"
         params = [fts_query]
         if subsystem:
             where += " AND e.subsystem = ?"
@@ -472,23 +897,45 @@ class KnowledgeDB:
             where += " AND e.category = ?"
             params.append(category)
 
-        total = self.conn.execute(
-            f"SELECT COUNT(*) FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid {where}",
-            params,
-        ).fetchone()[0]
-
+        # The total doesn't depend on limit or tags, so it is cached on its own
+        # and a repeat query with another page size skips counting every hit
+        count_key = ("search_total", fts_query, subsystem, category)
+        total = self._cache_get(count_key)
+
+        # COUNT(*) OVER () rides along with the page, so the FTS match runs once.
+        # With the total known and no base-table filter, FTS5 ranks the top-k.
+        window = ", COUNT(*) OVER () AS total_matches" if total is None else ""
+        top_k = total is not None and len(params) == 1
+        if top_k:
+            params.append(limit)
         sql = f"""
+            {_fts_hits_cte("entries_fts", top_k)}
             SELECT e.id, e.title, e.subsystem, e.category, e.summary, e.tags,
-                   -entries_fts.rank AS score
-            FROM entries_fts
-            JOIN entries e ON e.id = entries_fts.rowid
+                   -hits.rank AS score{window}
+            FROM hits
+            JOIN entries e ON e.id = hits.rowid
             {where}
             ORDER BY score DESC LIMIT ?
         """
         rows = [dict(row) for row in self.conn.execute(sql, params + [limit]).fetchall()]
+        if total is None:
+            if rows:
+                total = rows[0]["total_matches"]
+                for row in rows:
+                    del row["total_matches"]
+            elif limit > 0:
+                total = 0
+            else:
+                total = self.conn.execute(
+                    f"{_fts_hits_cte('entries_fts')} SELECT COUNT(*) FROM hits "
+                    f"JOIN entries e ON e.id = hits.rowid {where}",
+                    params,
+                ).fetchone()[0]
         if tags:
             rows = self._filter_by_tags(rows, tags)
-        return rows, total
+        self._cache_put(count_key, total)
+        self._cache_put(key, (rows, total))
+        return [dict(r) for r in rows], total
 
     def search_all(self, query, limit=10, subsystem=None, tags=None, tables=None):
         """Unified search across entries, classes, functions, and properties."""
@@ -498,66 +945,31 @@ class KnowledgeDB:
         if not terms:
             return {t: [] for t in search_tables}
         fts_query = " OR ".join(f'"{t}"*' for t in terms)
+        key = ("search_all", fts_query, limit, subsystem, tuple(tags or ()), tuple(search_tables))
+        hit = self._cache_get(key)
+        if hit is not None:
+            return {t: [dict(r) for r in rows] for t, rows in hit.items()}
         result = {}
 
-        if "entries" in search_tables:
-            sql = """SELECT e.id, e.title, e.subsystem, e.category, e.summary, e.tags,
-                            -entries_fts.rank AS score
-                     FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid
-                     WHERE entries_fts MATCH ?"""
-            p = [fts_query]
+        for table, (alias, columns) in SEARCH_ALL_COLUMNS.items():
+            if table not in search_tables:
+                continue
+            sql = f"""{_fts_hits_cte(table + "_fts", top_k=not subsystem)}
+                      SELECT {columns}, -hits.rank AS score
+                      FROM hits JOIN {table} {alias} ON {alias}.id = hits.rowid"""
+            p = [fts_query] if subsystem else [fts_query, limit]
             if subsystem:
-                sql += " AND e.subsystem = ?"
+                sql += f" WHERE {alias}.subsystem = ?"
                 p.append(subsystem)
             sql += " ORDER BY score DESC LIMIT ?"
             p.append(limit)
             rows = [dict(r) for r in self.conn.execute(sql, p).fetchall()]
-            if tags:
+            if table == "entries" and tags:
                 rows = self._filter_by_tags(rows, tags)
-            result["entries"] = rows
-
-        if "classes" in search_tables:
-            sql = """SELECT c.id, c.name, c.kind, c.subsystem, c.module, c.summary,
-                            -classes_fts.rank AS score
-                     FROM classes_fts JOIN classes c ON c.id = classes_fts.rowid
-                     WHERE classes_fts MATCH ?"""
-            p = [fts_query]
-            if subsystem:
-                sql += " AND c.subsystem = ?"
-                p.append(subsystem)
-            sql += " ORDER BY score DESC LIMIT ?"
-            p.append(limit)
-            result["classes"] = [dict(r) for r in self.conn.execute(sql, p).fetchall()]
-
-        if "functions" in search_tables:
-            sql = """SELECT f.id, f.name, f.qualified_name, f.class_name, f.subsystem,
-                            f.summary, f.is_virtual, f.is_blueprint_callable,
-                            -functions_fts.rank AS score
-                     FROM functions_fts JOIN functions f ON f.id = functions_fts.rowid
-                     WHERE functions_fts MATCH ?"""
-            p = [fts_query]
-            if subsystem:
-                sql += " AND f.subsystem = ?"
-                p.append(subsystem)
-            sql += " ORDER BY score DESC LIMIT ?"
-            p.append(limit)
-            result["functions"] = [dict(r) for r in self.conn.execute(sql, p).fetchall()]
-
-        if "properties" in search_tables:
-            sql = """SELECT p.id, p.name, p.qualified_name, p.class_name, p.subsystem,
-                            p.property_type, p.summary,
-                            -properties_fts.rank AS score
-                     FROM properties_fts JOIN properties p ON p.id = properties_fts.rowid
-                     WHERE properties_fts MATCH ?"""
-            p = [fts_query]
-            if subsystem:
-                sql += " AND p.subsystem = ?"
-                p.append(subsystem)
-            sql += " ORDER BY score DESC LIMIT ?"
-            p.append(limit)
-            result["properties"] = [dict(r) for r in self.conn.execute(sql, p).fetchall()]
+            result[table] = rows
 
-        return result
+        self._cache_put(key, result)
+        return {t: [dict(r) for r in rows] for t, rows in result.items()}
 
     def get(self, entry_id):
         row = self.conn.execute(
@@ -565,7 +977,19 @@ class KnowledgeDB:
         ).fetchone()
         return dict(row) if row else None
 
-    def list_entries(self, subsystem=None, category=None, limit=20, offset=0):
+    def get_decoded(self, entry_id):
+        """get() with the JSON array columns decoded to lists."""
+        entry = self.get(entry_id)
+        if entry:
+            for f in ENTRY_ARRAY_FIELDS:
+                entry[f] = _safe_json_loads(entry[f])
+        return entry
+
+    def list_entries(self, subsystem=None, category=None, limit=20, offset=0, after=None):
+        """List entries newest-first as LIST_COLUMNS (no content; use get() for
+        that). Pass the last row of a page as after=(updated_at, id) to fetch the
+        next page by keyset instead of scanning past `offset` rows. The seek uses
+        the pair as given, so it holds even if that row is since edited or deleted."""
         where = "WHERE 1=1"
         params = []
         if subsystem:
@@ -574,9 +998,40 @@ class KnowledgeDB:
         if category:
             where += " AND category = ?"
             params.append(category)
-        total = self.conn.execute(f"SELECT COUNT(*) FROM entries {where}", params).fetchone()[0]
-        sql = f"SELECT * FROM entries {where} ORDER BY updated_at DESC LIMIT ? OFFSET ?"
+
+        page_where, page_params = where, list(params)
+        if after is not None:
+            after_updated_at, after_id = after
+            # Same order as idx_entries_list: updated_at DESC, then id ascending
+            page_where += " AND (updated_at < ? OR (updated_at = ? AND id > ?))"
+            page_params += [after_updated_at, after_updated_at, after_id]
+            offset = 0
+
+        if not params:
+            total = self.conn.execute("SELECT n FROM row_counts WHERE tbl = 'entries'").fetchone()[0]
+            sql = f"SELECT {LIST_COLUMNS} FROM entries {page_where} ORDER BY updated_at DESC, id LIMIT ? OFFSET ?"
+            rows = [dict(row) for row in self.conn.execute(sql, page_params + [limit, offset]).fetchall()]
+            return rows, total
+
+        if after is not None:
+            # The window would only count rows after the cursor
+            total = self.conn.execute(f"SELECT COUNT(*) FROM entries {where}", params).fetchone()[0]
+            sql = f"SELECT {LIST_COLUMNS} FROM entries {page_where} ORDER BY updated_at DESC, id LIMIT ?"
+            rows = [dict(row) for row in self.conn.execute(sql, page_params + [limit]).fetchall()]
+            return rows, total
+
+        sql = (f"SELECT {LIST_COLUMNS}, COUNT(*) OVER () AS total_matches FROM entries {where} "
+               "ORDER BY updated_at DESC, id LIMIT ? OFFSET ?")
         rows = [dict(row) for row in self.conn.execute(sql, params + [limit, offset]).fetchall()]
+        if rows:
+            total = rows[0]["total_matches"]
+            for row in rows:
+                del row["total_matches"]
+        elif offset <= 0 and limit > 0:
+            total = 0
+        else:
+            # Page past the end: the window had no row to report the total on
+            total = self.conn.execute(f"SELECT COUNT(*) FROM entries {where}", params).fetchone()[0]
         return rows, total
 
     def update(self, entry_id, **fields):
@@ -584,9 +1039,9 @@ class KnowledgeDB:
         if not existing:
             return False
 
-        if "subsystem" in fields and fields["subsystem"] not in VALID_SUBSYSTEMS:
+        if "subsystem" in fields and fields["subsystem"] not in SUBSYSTEM_SET:
             raise ValueError(f"Invalid subsystem: '{fields['subsystem']}'")
-        if "category" in fields and fields["category"] not in VALID_CATEGORIES:
+        if "category" in fields and fields["category"] not in CATEGORY_SET:
             raise ValueError(f"Invalid category: '{fields['category']}'")
 
         allowed = {"title", "subsystem", "category", "summary", "content",
@@ -598,14 +1053,20 @@ class KnowledgeDB:
         for k in ("source_files", "tags", "related_entries"):
             if k in updates and isinstance(updates[k], list):
                 if k == "tags":
-                    updates[k] = json.dumps(self._normalize_tags(updates[k]))
+                    updates[k] = _json_dumps(self._normalize_tags(updates[k]))
                 else:
-                    updates[k] = json.dumps(updates[k])
+                    updates[k] = _json_dumps(updates[k])
 
         updates["updated_at"] = datetime.now(timezone.utc).isoformat()
         set_clause = ", ".join(f"{k} = ?" for k in updates)
         values = list(updates.values()) + [entry_id]
-        self.conn.execute(f"UPDATE entries SET {set_clause} WHERE id = ?", values)
+        try:
+            self.conn.execute(f"UPDATE entries SET {set_clause} WHERE id = ?", values)
+        except sqlite3.IntegrityError:
+            self.conn.rollback()
+            if "title" not in updates:
+                raise
+            raise ValueError(f"Duplicate title: '{updates['title']}'") from None
         self.conn.commit()
         return True
 
@@ -617,25 +1078,21 @@ class KnowledgeDB:
         return cursor.rowcount > 0
 
     def stats(self):
-        total = self.conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        counts = dict(self.conn.execute("SELECT tbl, n FROM row_counts").fetchall())
         by_subsystem = dict(self.conn.execute(
             "SELECT subsystem, COUNT(*) FROM entries GROUP BY subsystem ORDER BY COUNT(*) DESC"
         ).fetchall())
         by_category = dict(self.conn.execute(
             "SELECT category, COUNT(*) FROM entries GROUP BY category ORDER BY COUNT(*) DESC"
         ).fetchall())
-        classes_total = self.conn.execute("SELECT COUNT(*) FROM classes").fetchone()[0]
-        functions_total = self.conn.execute("SELECT COUNT(*) FROM functions").fetchone()[0]
-        properties_total = self.conn.execute("SELECT COUNT(*) FROM properties").fetchone()[0]
-        files_analyzed = self.conn.execute("SELECT COUNT(*) FROM analysis_log").fetchone()[0]
         by_depth = dict(self.conn.execute(
             "SELECT analysis_depth, COUNT(*) FROM classes GROUP BY analysis_depth"
         ).fetchall())
         return {
-            "total": total, "by_subsystem": by_subsystem, "by_category": by_category,
+            "total": counts["entries"], "by_subsystem": by_subsystem, "by_category": by_category,
             "structured": {
-                "classes": classes_total, "functions": functions_total,
-                "properties": properties_total, "files_analyzed": files_analyzed,
+                "classes": counts["classes"], "functions": counts["functions"],
+                "properties": counts["properties"], "files_analyzed": counts["analysis_log"],
                 "by_depth": by_depth,
             },
         }
@@ -649,146 +1106,127 @@ class KnowledgeDB:
         for item in (new_list or []):
             if item not in merged:
                 merged.append(item)
-        return json.dumps(merged)
+        return _json_dumps(merged)
 
     def save_class(self, name, kind, subsystem, module, header_path, _commit=True, **kwargs):
-        if kind not in VALID_KINDS:
+        if kind not in KIND_SET:
             raise ValueError(f"Invalid kind: '{kind}'. Valid: {', '.join(VALID_KINDS)}")
-        if subsystem not in VALID_SUBSYSTEMS:
+        if subsystem not in SUBSYSTEM_SET:
             raise ValueError(f"Invalid subsystem: '{subsystem}'")
 
         now = datetime.now(timezone.utc).isoformat()
-        existing = self.conn.execute("SELECT * FROM classes WHERE name = ?", (name,)).fetchone()
-
-        if existing:
-            existing = dict(existing)
-            updates = {}
-            # Simple fields: update if provided and non-empty
-            for field in ("parent_class", "outer_class", "class_specifiers", "doc_comment",
-                          "summary", "lifecycle_order", "entry_id", "source_line_count"):
-                val = kwargs.get(field)
-                if val is not None and val != "":
-                    updates[field] = val
-            # Always allow updating subsystem, module, header_path, kind
-            updates["subsystem"] = subsystem
-            updates["module"] = module
-            updates["header_path"] = header_path
-            updates["kind"] = kind
-            # Merge JSON arrays
-            for field in ("inheritance_chain", "known_children", "interfaces",
-                          "key_methods", "key_properties", "key_delegates", "related_classes"):
-                new_val = kwargs.get(field)
-                if new_val:
-                    updates[field] = self._merge_json_arrays(existing[field], new_val)
-            # Upgrade depth only
-            new_depth = kwargs.get("analysis_depth", "stub")
-            if DEPTH_ORDER.get(new_depth, 0) > DEPTH_ORDER.get(existing["analysis_depth"], 0):
-                updates["analysis_depth"] = new_depth
-            updates["updated_at"] = now
-            if updates:
-                set_clause = ", ".join(f"{k} = ?" for k in updates)
-                values = list(updates.values()) + [name]
-                self.conn.execute(f"UPDATE classes SET {set_clause} WHERE name = ?", values)
-                if _commit:
-                    self.conn.commit()
-            return {"upserted": True, "id": existing["id"], "name": name, "action": "updated"}
-        else:
-            json_fields = {}
-            for field in ("inheritance_chain", "known_children", "interfaces",
-                          "key_methods", "key_properties", "key_delegates", "related_classes"):
-                json_fields[field] = json.dumps(kwargs.get(field) or [])
-
-            cursor = self.conn.execute(
-                """INSERT INTO classes
-                   (name, kind, parent_class, outer_class, subsystem, module, header_path,
-                    class_specifiers, doc_comment, summary,
-                    inheritance_chain, known_children, interfaces,
-                    key_methods, key_properties, key_delegates,
-                    lifecycle_order, related_classes, entry_id,
-                    analysis_depth, source_line_count, created_at, updated_at)
-                   VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""",
-                (
-                    name, kind, kwargs.get("parent_class"), kwargs.get("outer_class"),
-                    subsystem, module, header_path,
-                    kwargs.get("class_specifiers", ""), kwargs.get("doc_comment", ""),
-                    kwargs.get("summary", ""),
-                    json_fields["inheritance_chain"], json_fields["known_children"],
-                    json_fields["interfaces"], json_fields["key_methods"],
-                    json_fields["key_properties"], json_fields["key_delegates"],
-                    kwargs.get("lifecycle_order", ""), json_fields["related_classes"],
-                    kwargs.get("entry_id"),
-                    kwargs.get("analysis_depth", "stub"),
-                    kwargs.get("source_line_count", 0),
-                    now, now,
-                ),
-            )
-            if _commit:
-                self.conn.commit()
-            return {"upserted": True, "id": cursor.lastrowid, "name": name, "action": "created"}
+        params = {
+            "name": name, "kind": kind, "subsystem": subsystem,
+            "module": module, "header_path": header_path,
+            "parent_class": kwargs.get("parent_class"),
+            "outer_class": kwargs.get("outer_class"),
+            "class_specifiers": kwargs.get("class_specifiers", ""),
+            "doc_comment": kwargs.get("doc_comment", ""),
+            "summary": kwargs.get("summary", ""),
+            "lifecycle_order": kwargs.get("lifecycle_order", ""),
+            "entry_id": kwargs.get("entry_id"),
+            "source_line_count": kwargs.get("source_line_count", 0),
+            "analysis_depth": kwargs.get("analysis_depth", "stub"),
+            "now": now,
+        }
+        # On conflict, simple fields only overwrite when the caller supplied them
+        for field in CLASS_SIMPLE_FIELDS:
+            params[f"new_{field}"] = kwargs.get(field)
+        for field in CLASS_ARRAY_FIELDS:
+            params[field] = _json_dumps(kwargs.get(field) or [])
+
+        row_id, action = self._upsert("classes", "name", _INSERT_CLASS_SQL, _UPDATE_CLASS_SQL, params)
+        if _commit:
+            self.conn.commit()
+        return {"upserted": True, "id": row_id, "name": name, "action": action}
+
+    def _upsert(self, table, key, insert_sql, update_sql, params):
+        """Save one row and return (id, action). Only the INSERT branch returns
+        an id from insert_sql, so "created" vs "updated" never depends on clock
+        resolution; the insert also takes the write lock before anything is
+        read. No row back from update_sql means the existing row already held
+        every value and nothing was written."""
+        row = self.conn.execute(insert_sql, params).fetchone()
+        if row is not None:
+            return row[0], "created"
+        row = self.conn.execute(update_sql, params).fetchone()
+        if row is not None:
+            return row[0], "updated"
+        found = self.conn.execute(f"SELECT id FROM {table} WHERE {key} = ?", (params[key],)).fetchone()
+        return found[0], "unchanged"
 
     def get_class(self, name):
         row = self.conn.execute("SELECT * FROM classes WHERE name = ?", (name,)).fetchone()
         if not row:
             return None
-        d = dict(row)
-        for f in ("inheritance_chain", "known_children", "interfaces",
-                  "key_methods", "key_properties", "key_delegates", "related_classes"):
+        return self._decode_class(dict(row))
+
+    @staticmethod
+    def _decode_class(d):
+        for f in CLASS_ARRAY_FIELDS:
             d[f] = _safe_json_loads(d[f])
         return d
 
     def query_hierarchy(self, class_name, direction="both", depth=10,
-                        max_children_per_level=50, max_total=500):
-        result = {"class": class_name, "parents": [], "children": []}
+                        max_children_per_level=50, max_total=500, shape="nested"):
+        # children's structure follows shape alone, whichever directions run
+        result = {"class": class_name, "parents": [], "children": {} if shape == "mapping" else []}
+        if shape == "flat":
+            result["child_parents"] = []
+            result["child_depths"] = []
         if direction in ("parents", "both"):
-            current = class_name
-            for _ in range(depth):
-                row = self.conn.execute(
-                    "SELECT name, parent_class FROM classes WHERE name = ?", (current,)
-                ).fetchone()
-                if not row or not row["parent_class"]:
-                    break
-                result["parents"].append(row["parent_class"])
-                current = row["parent_class"]
+            result["parents"] = [
+                row[0] for row in self.conn.execute(_PARENTS_SQL, (class_name, depth, depth))
+            ]
         if direction in ("children", "both"):
-            total_count = [0]
-
-            def _get_children(name, d):
-                if d <= 0 or total_count[0] >= max_total:
-                    return []
-                rows = self.conn.execute(
-                    "SELECT name FROM classes WHERE parent_class = ? LIMIT ?",
-                    (name, max_children_per_level),
-                ).fetchall()
-                children = []
-                for r in rows:
-                    if total_count[0] >= max_total:
-                        break
-                    total_count[0] += 1
-                    children.append({"name": r["name"], "children": _get_children(r["name"], d - 1)})
-                return children
-
-            result["children"] = _get_children(class_name, depth)
-            if total_count[0] >= max_total:
+            # Rows arrive breadth-first into parallel arrays; index -1 stands
+            # for class_name itself. Parents are resolved against the
+            # previous level only, so cyclic data can't alias across levels.
+            names = []
+            parents = array("i")
+            depths = array("i")
+            prev_level, cur_level, level = {class_name: -1}, {}, 1
+            for name, parent, d in self.conn.execute(
+                _CHILDREN_SQL, (class_name, max_children_per_level, depth, max_total + 1)
+            ):
+                if d != level:
+                    prev_level, cur_level, level = cur_level, {}, d
+                cur_level[name] = len(names)
+                names.append(name)
+                parents.append(prev_level[parent])
+                depths.append(d)
+
+            if shape == "flat":
+                result["children"] = names
+                result["child_parents"] = parents.tolist()
+                result["child_depths"] = depths.tolist()
+            elif shape == "mapping":
+                # Sibling class names are unique, so each level keys by name
+                subtrees = [{} for _ in names]
+                root = result["children"]
+                for name, subtree, parent in zip(names, subtrees, parents):
+                    (subtrees[parent] if parent >= 0 else root)[name] = subtree
+            else:
+                nodes = [{"name": n, "children": []} for n in names]
+                for node, parent in zip(nodes, parents):
+                    (nodes[parent]["children"] if parent >= 0 else result["children"]).append(node)
+            if len(names) >= max_total:
                 result["truncated"] = True
         return result
 
     # ── Functions ─────────────────────────────────────────────────────────────
 
     def save_function(self, name, subsystem, _commit=True, **kwargs):
-        if subsystem not in VALID_SUBSYSTEMS:
+        if subsystem not in SUBSYSTEM_SET:
             raise ValueError(f"Invalid subsystem: '{subsystem}'")
         class_name = kwargs.get("class_name")
         qualified = f"{class_name}::{name}" if class_name else name
         now = datetime.now(timezone.utc).isoformat()
 
-        existing = self.conn.execute(
-            "SELECT id FROM functions WHERE qualified_name = ?", (qualified,)
-        ).fetchone()
-
         fields = {
             "name": name, "qualified_name": qualified, "class_name": class_name,
             "subsystem": subsystem, "return_type": kwargs.get("return_type", "void"),
-            "parameters": json.dumps(kwargs.get("parameters") or []),
+            "parameters": _json_dumps(kwargs.get("parameters") or []),
             "signature_full": kwargs.get("signature_full", ""),
             "ufunction_specifiers": kwargs.get("ufunction_specifiers", ""),
             "is_virtual": kwargs.get("is_virtual", False),
@@ -802,39 +1240,31 @@ class KnowledgeDB:
             "summary": kwargs.get("summary", ""),
             "call_context": kwargs.get("call_context", ""),
             "call_order": kwargs.get("call_order", ""),
-            "calls_into": json.dumps(kwargs.get("calls_into") or []),
-            "called_by": json.dumps(kwargs.get("called_by") or []),
+            "calls_into": _json_dumps(kwargs.get("calls_into") or []),
+            "called_by": _json_dumps(kwargs.get("called_by") or []),
             "entry_id": kwargs.get("entry_id"),
             "updated_at": now,
+            "created_at": now,
         }
 
-        if existing:
-            set_clause = ", ".join(f"{k} = ?" for k in fields)
-            values = list(fields.values()) + [qualified]
-            self.conn.execute(f"UPDATE functions SET {set_clause} WHERE qualified_name = ?", values)
-            if _commit:
-                self.conn.commit()
-            return {"upserted": True, "id": existing["id"], "qualified_name": qualified, "action": "updated"}
-        else:
-            fields["created_at"] = now
-            cols = ", ".join(fields.keys())
-            placeholders = ", ".join("?" for _ in fields)
-            cursor = self.conn.execute(
-                f"INSERT INTO functions ({cols}) VALUES ({placeholders})", list(fields.values())
-            )
-            if _commit:
-                self.conn.commit()
-            return {"upserted": True, "id": cursor.lastrowid, "qualified_name": qualified, "action": "created"}
+        row_id, action = self._upsert(
+            "functions", "qualified_name", *_upsert_sql("functions", tuple(fields), "qualified_name"), fields,
+        )
+        if _commit:
+            self.conn.commit()
+        return {"upserted": True, "id": row_id, "qualified_name": qualified, "action": action}
 
     def query_calls(self, function_name, direction="both", depth=3):
-        # Find by qualified_name or plain name
+        # "Class::Func" is a qualified name; anything else is matched on the plain
+        # name (which equals qualified_name for free functions). One index each.
+        column = "qualified_name" if "::" in function_name else "name"
         row = self.conn.execute(
-            "SELECT * FROM functions WHERE qualified_name = ? OR name = ? LIMIT 1",
-            (function_name, function_name)
+            f"SELECT {_CALLS_COLUMNS.get(direction, _CALLS_BASE_COLUMNS)} "
+            f"FROM functions WHERE {column} = ? LIMIT 1",
+            (function_name,)
         ).fetchone()
         if not row:
             return {"error": f"Function '{function_name}' not found."}
-        row = dict(row)
         result = {
             "function": row["qualified_name"],
             "summary": row["summary"],
@@ -848,10 +1278,15 @@ class KnowledgeDB:
         return result
 
     def query_class_full(self, class_name, include_methods=True, include_properties=True):
-        cls = self.get_class(class_name)
-        if not cls:
+        # The linked entry's title comes along in the class lookup
+        row = self.conn.execute(
+            "SELECT c.*, e.title AS narrative_title FROM classes c "
+            "LEFT JOIN entries e ON e.id = c.entry_id WHERE c.name = ?", (class_name,)
+        ).fetchone()
+        if not row:
             return {"error": f"Class '{class_name}' not found."}
-        result = dict(cls)
+        result = self._decode_class(dict(row))
+        narrative_title = result.pop("narrative_title")
         if include_methods:
             rows = self.conn.execute(
                 "SELECT * FROM functions WHERE class_name = ?", (class_name,)
@@ -868,25 +1303,18 @@ class KnowledgeDB:
                 "SELECT * FROM properties WHERE class_name = ?", (class_name,)
             ).fetchall()
             result["properties_detail"] = [dict(r) for r in rows]
-        # Link narrative entry
-        if cls.get("entry_id"):
-            entry = self.get(cls["entry_id"])
-            if entry:
-                result["narrative_entry"] = {"id": entry["id"], "title": entry["title"]}
+        if narrative_title is not None:
+            result["narrative_entry"] = {"id": result["entry_id"], "title": narrative_title}
         return result
 
     # ── Properties ────────────────────────────────────────────────────────────
 
     def save_property(self, name, class_name, subsystem, property_type, _commit=True, **kwargs):
-        if subsystem not in VALID_SUBSYSTEMS:
+        if subsystem not in SUBSYSTEM_SET:
             raise ValueError(f"Invalid subsystem: '{subsystem}'")
         qualified = f"{class_name}::{name}"
         now = datetime.now(timezone.utc).isoformat()
 
-        existing = self.conn.execute(
-            "SELECT id FROM properties WHERE qualified_name = ?", (qualified,)
-        ).fetchone()
-
         fields = {
             "name": name, "qualified_name": qualified, "class_name": class_name,
             "subsystem": subsystem, "property_type": property_type,
@@ -901,25 +1329,15 @@ class KnowledgeDB:
             "summary": kwargs.get("summary", ""),
             "entry_id": kwargs.get("entry_id"),
             "updated_at": now,
+            "created_at": now,
         }
 
-        if existing:
-            set_clause = ", ".join(f"{k} = ?" for k in fields)
-            values = list(fields.values()) + [qualified]
-            self.conn.execute(f"UPDATE properties SET {set_clause} WHERE qualified_name = ?", values)
-            if _commit:
-                self.conn.commit()
-            return {"upserted": True, "id": existing["id"], "qualified_name": qualified, "action": "updated"}
-        else:
-            fields["created_at"] = now
-            cols = ", ".join(fields.keys())
-            placeholders = ", ".join("?" for _ in fields)
-            cursor = self.conn.execute(
-                f"INSERT INTO properties ({cols}) VALUES ({placeholders})", list(fields.values())
-            )
-            if _commit:
-                self.conn.commit()
-            return {"upserted": True, "id": cursor.lastrowid, "qualified_name": qualified, "action": "created"}
+        row_id, action = self._upsert(
+            "properties", "qualified_name", *_upsert_sql("properties", tuple(fields), "qualified_name"), fields,
+        )
+        if _commit:
+            self.conn.commit()
+        return {"upserted": True, "id": row_id, "qualified_name": qualified, "action": action}
 
     # ── Batch Save ────────────────────────────────────────────────────────────
 
@@ -929,20 +1347,16 @@ class KnowledgeDB:
         Returns list of results; individual errors don't abort others."""
         results = []
         errors = []
+        savers = self._batch_savers
         for i, item in enumerate(items):
             item_type = item.get("type")
+            saver = savers.get(item_type) if isinstance(item_type, str) else None
+            if saver is None:
+                errors.append({"index": i, "error": f"Invalid type: '{item_type}'"})
+                continue
             fields = {k: v for k, v in item.items() if k != "type"}
             try:
-                if item_type == "class":
-                    r = self.save_class(_commit=False, **fields)
-                elif item_type == "function":
-                    r = self.save_function(_commit=False, **fields)
-                elif item_type == "property":
-                    r = self.save_property(_commit=False, **fields)
-                else:
-                    errors.append({"index": i, "error": f"Invalid type: '{item_type}'"})
-                    continue
-                results.append(r)
+                results.append(saver(_commit=False, **fields))
             except Exception as e:
                 errors.append({"index": i, "error": str(e)})
         self.conn.commit()
@@ -951,7 +1365,7 @@ class KnowledgeDB:
     # ── Analysis Log ──────────────────────────────────────────────────────────
 
     def log_analysis(self, file_path, module, subsystem, analysis_depth, **kwargs):
-        if subsystem not in VALID_SUBSYSTEMS:
+        if subsystem not in SUBSYSTEM_SET:
             raise ValueError(f"Invalid subsystem: '{subsystem}'")
         now = datetime.now(timezone.utc).isoformat()
         cursor = self.conn.execute(
@@ -969,30 +1383,22 @@ class KnowledgeDB:
         return {"logged": True, "id": cursor.lastrowid}
 
     def analysis_status(self, group_by="module", module=None, subsystem=None):
-        result = {}
-        # Overall counts
-        result["total_classes"] = self.conn.execute("SELECT COUNT(*) FROM classes").fetchone()[0]
-        result["total_functions"] = self.conn.execute("SELECT COUNT(*) FROM functions").fetchone()[0]
-        result["total_properties"] = self.conn.execute("SELECT COUNT(*) FROM properties").fetchone()[0]
-        result["files_analyzed"] = self.conn.execute("SELECT COUNT(*) FROM analysis_log").fetchone()[0]
+        # Overall counts, all four from the trigger-maintained row_counts
+        counts = dict(self.conn.execute(
+            "SELECT tbl, n FROM row_counts WHERE tbl IN "
+            "('classes', 'functions', 'properties', 'analysis_log')"
+        ).fetchall())
+        result = {
+            "total_classes": counts["classes"], "total_functions": counts["functions"],
+            "total_properties": counts["properties"], "files_analyzed": counts["analysis_log"],
+        }
         result["by_depth"] = dict(self.conn.execute(
             "SELECT analysis_depth, COUNT(*) FROM classes GROUP BY analysis_depth"
         ).fetchall())
 
-        sql = "SELECT {col}, analysis_depth, COUNT(*) as cnt FROM analysis_log"
-        params = []
-        wheres = []
-        if module:
-            wheres.append("module = ?")
-            params.append(module)
-        if subsystem:
-            wheres.append("subsystem = ?")
-            params.append(subsystem)
-        if wheres:
-            sql += " WHERE " + " AND ".join(wheres)
         col = "module" if group_by == "module" else "subsystem" if group_by == "subsystem" else "analysis_depth"
-        sql = sql.format(col=col)
-        sql += f" GROUP BY {col}, analysis_depth ORDER BY {col}"
+        params = [v for v in (module, subsystem) if v]
+        sql = _analysis_breakdown_sql(col, bool(module), bool(subsystem))
         rows = self.conn.execute(sql, params).fetchall()
         breakdown = {}
         for r in rows:
@@ -1146,6 +1552,10 @@ TOOLS = [
                     "description": "Skip first N results for pagination (default 0).",
                     "default": 0,
                 },
+                "cursor": {
+                    "type": "string",
+                    "description": "Keyset pagination: pass the previous page's next_cursor to fetch the page after it. Overrides offset.",
+                },
             },
         },
     ),
@@ -1319,6 +1729,12 @@ TOOLS = [
                     "default": 500,
                     "description": "Max total children nodes in the whole tree.",
                 },
+                "shape": {
+                    "type": "string",
+                    "enum": ["nested", "flat", "mapping"],
+                    "default": "nested",
+                    "description": "'flat' returns children as a name list with parallel child_parents/child_depths arrays instead of a nested tree. 'mapping' returns children as {name: {child_name: {...}}} for lookup by name.",
+                },
             },
             "required": ["class_name"],
         },
@@ -1415,160 +1831,205 @@ def create_server():
     return server, db
 
 
-def _handle(db: KnowledgeDB, name: str, args: dict):
-    if name == "ue_save":
-        result = db.save(
-            title=args["title"],
-            subsystem=args["subsystem"],
-            category=args["category"],
-            summary=args["summary"],
-            content=args["content"],
-            source_files=args.get("source_files"),
-            tags=args.get("tags"),
-            related_entries=args.get("related_entries"),
-        )
-        if isinstance(result, dict):
-            return result
-        return {"saved": True, "id": result, "title": args["title"]}
-
-    elif name == "ue_search":
-        tables = args.get("tables")
-        limit = args.get("limit", 10)
-        tags = args.get("tags")
-        if tables:
-            # Multi-table search
-            result = db.search_all(
-                query=args["query"],
-                limit=limit,
-                subsystem=args.get("subsystem"),
-                tags=tags,
-                tables=tables,
-            )
-            return result
-        else:
-            # Entries-only search (backwards compatible)
-            rows, total = db.search(
-                query=args["query"],
-                limit=limit,
-                subsystem=args.get("subsystem"),
-                category=args.get("category"),
-                tags=tags,
-            )
-            compact = []
-            for r in rows:
-                compact.append({
-                    "id": r["id"],
-                    "title": r["title"],
-                    "subsystem": r["subsystem"],
-                    "category": r["category"],
-                    "summary": r["summary"],
-                    "tags": _safe_json_loads(r["tags"]),
-                    "score": round(r.get("score", 0), 3),
-                })
-            return {"results": compact, "count": len(compact), "total_matches": total}
-
-    elif name == "ue_get":
-        entry = db.get(args["id"])
-        if not entry:
-            return {"error": f"Entry {args['id']} not found."}
-        entry["source_files"] = _safe_json_loads(entry["source_files"])
-        entry["tags"] = _safe_json_loads(entry["tags"])
-        entry["related_entries"] = _safe_json_loads(entry["related_entries"])
-        return entry
-
-    elif name == "ue_list":
-        entries, total = db.list_entries(
+def _handle_save(db: KnowledgeDB, args: dict):
+    result = db.save(
+        title=args["title"],
+        subsystem=args["subsystem"],
+        category=args["category"],
+        summary=args["summary"],
+        content=args["content"],
+        source_files=args.get("source_files"),
+        tags=args.get("tags"),
+        related_entries=args.get("related_entries"),
+    )
+    if isinstance(result, dict):
+        return result
+    return {"saved": True, "id": result, "title": args["title"]}
+
+
+def _handle_search(db: KnowledgeDB, args: dict):
+    tables = args.get("tables")
+    limit = args.get("limit", 10)
+    tags = args.get("tags")
+    if tables:
+        # Multi-table search
+        return db.search_all(
+            query=args["query"],
+            limit=limit,
             subsystem=args.get("subsystem"),
-            category=args.get("category"),
-            limit=args.get("limit", 20),
-            offset=args.get("offset", 0),
-        )
-        compact = []
-        for e in entries:
-            compact.append({
-                "id": e["id"],
-                "title": e["title"],
-                "subsystem": e["subsystem"],
-                "category": e["category"],
-                "summary": e["summary"],
-                "tags": _safe_json_loads(e["tags"]),
-                "updated_at": e["updated_at"],
-            })
-        return {"entries": compact, "count": len(compact), "total_matches": total}
-
-    elif name == "ue_update":
-        entry_id = args["id"]
-        fields = {k: v for k, v in args.items() if k != "id"}
-        ok = db.update(entry_id, **fields)
-        if not ok:
-            return {"error": f"Entry {entry_id} not found or no changes."}
-        return {"updated": True, "id": entry_id}
-
-    elif name == "ue_delete":
-        ok = db.delete(args["id"])
-        if not ok:
-            return {"error": f"Entry {args['id']} not found."}
-        return {"deleted": True, "id": args["id"]}
-
-    elif name == "ue_stats":
-        return db.stats()
-
-    # ── Structured code tools ────────────────────────────────────────────
-
-    elif name == "ue_save_class":
-        required = {k: args[k] for k in ("name", "kind", "subsystem", "module", "header_path")}
-        optional = {k: v for k, v in args.items() if k not in required}
-        return db.save_class(**required, **optional)
-
-    elif name == "ue_save_function":
-        required = {"name": args["name"], "subsystem": args["subsystem"]}
-        optional = {k: v for k, v in args.items() if k not in ("name", "subsystem")}
-        return db.save_function(**required, **optional)
-
-    elif name == "ue_save_property":
-        required = {k: args[k] for k in ("name", "class_name", "subsystem", "property_type")}
-        optional = {k: v for k, v in args.items() if k not in required}
-        return db.save_property(**required, **optional)
-
-    elif name == "ue_query_class":
-        return db.query_class_full(
-            class_name=args["class_name"],
-            include_methods=args.get("include_methods", True),
-            include_properties=args.get("include_properties", True),
+            tags=tags,
+            tables=tables,
         )
+    # Entries-only search (backwards compatible)
+    rows, total = db.search(
+        query=args["query"],
+        limit=limit,
+        subsystem=args.get("subsystem"),
+        category=args.get("category"),
+        tags=tags,
+    )
+    compact = []
+    for r in rows:
+        compact.append({
+            "id": r["id"],
+            "title": r["title"],
+            "subsystem": r["subsystem"],
+            "category": r["category"],
+            "summary": r["summary"],
+            "tags": _safe_json_loads(r["tags"]),
+            "score": round(r.get("score", 0), 3),
+        })
+    return {"results": compact, "count": len(compact), "total_matches": total}
+
+
+def _handle_get(db: KnowledgeDB, args: dict):
+    entry = db.get_decoded(args["id"])
+    if not entry:
+        return {"error": f"Entry {args['id']} not found."}
+    return entry
+
+
+def _decode_list_cursor(cursor):
+    """ue_list next_cursor ("<updated_at>|<id>") -> (updated_at, id)."""
+    updated_at, sep, entry_id = cursor.rpartition("|")
+    if not sep or not entry_id.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return updated_at, int(entry_id)
+
+
+def _handle_list(db: KnowledgeDB, args: dict):
+    cursor = args.get("cursor")
+    entries, total = db.list_entries(
+        subsystem=args.get("subsystem"),
+        category=args.get("category"),
+        limit=args.get("limit", 20),
+        offset=args.get("offset", 0),
+        after=_decode_list_cursor(cursor) if cursor else None,
+    )
+    compact = []
+    for e in entries:
+        compact.append({
+            "id": e["id"],
+            "title": e["title"],
+            "subsystem": e["subsystem"],
+            "category": e["category"],
+            "summary": e["summary"],
+            "tags": _safe_json_loads(e["tags"]),
+            "updated_at": e["updated_at"],
+        })
+    result = {"entries": compact, "count": len(compact), "total_matches": total}
+    if compact and len(compact) == args.get("limit", 20):
+        last = compact[-1]
+        result["next_cursor"] = f"{last['updated_at']}|{last['id']}"
+    return result
+
+
+def _handle_update(db: KnowledgeDB, args: dict):
+    entry_id = args["id"]
+    fields = {k: v for k, v in args.items() if k != "id"}
+    ok = db.update(entry_id, **fields)
+    if not ok:
+        return {"error": f"Entry {entry_id} not found or no changes."}
+    return {"updated": True, "id": entry_id}
+
+
+def _handle_delete(db: KnowledgeDB, args: dict):
+    ok = db.delete(args["id"])
+    if not ok:
+        return {"error": f"Entry {args['id']} not found."}
+    return {"deleted": True, "id": args["id"]}
+
+
+def _handle_stats(db: KnowledgeDB, args: dict):
+    return db.stats()
+
+
+# ── Structured code tools ────────────────────────────────────────────
+
+# The save tools' argument names are the savers' keyword names, so args are
+# forwarded as-is; a missing required field surfaces as the saver's TypeError.
+
+def _handle_save_class(db: KnowledgeDB, args: dict):
+    return db.save_class(**args)
+
+
+def _handle_save_function(db: KnowledgeDB, args: dict):
+    return db.save_function(**args)
+
+
+def _handle_save_property(db: KnowledgeDB, args: dict):
+    return db.save_property(**args)
+
+
+def _handle_query_class(db: KnowledgeDB, args: dict):
+    return db.query_class_full(
+        class_name=args["class_name"],
+        include_methods=args.get("include_methods", True),
+        include_properties=args.get("include_properties", True),
+    )
+
+
+def _handle_query_hierarchy(db: KnowledgeDB, args: dict):
+    return db.query_hierarchy(
+        class_name=args["class_name"],
+        direction=args.get("direction", "both"),
+        depth=args.get("depth", 10),
+        max_children_per_level=args.get("max_children_per_level", 50),
+        max_total=args.get("max_total", 500),
+        shape=args.get("shape", "nested"),
+    )
 
-    elif name == "ue_query_hierarchy":
-        return db.query_hierarchy(
-            class_name=args["class_name"],
-            direction=args.get("direction", "both"),
-            depth=args.get("depth", 10),
-            max_children_per_level=args.get("max_children_per_level", 50),
-            max_total=args.get("max_total", 500),
-        )
 
-    elif name == "ue_query_calls":
-        return db.query_calls(
-            function_name=args["function_name"],
-            direction=args.get("direction", "both"),
-            depth=args.get("depth", 3),
-        )
+def _handle_query_calls(db: KnowledgeDB, args: dict):
+    return db.query_calls(
+        function_name=args["function_name"],
+        direction=args.get("direction", "both"),
+        depth=args.get("depth", 3),
+    )
 
-    elif name == "ue_analysis_status":
-        return db.analysis_status(
-            group_by=args.get("group_by", "module"),
-            module=args.get("module"),
-            subsystem=args.get("subsystem"),
-        )
 
-    elif name == "ue_log_analysis":
-        required = {k: args[k] for k in ("file_path", "module", "subsystem", "analysis_depth")}
-        optional = {k: v for k, v in args.items() if k not in required}
-        return db.log_analysis(**required, **optional)
+def _handle_analysis_status(db: KnowledgeDB, args: dict):
+    return db.analysis_status(
+        group_by=args.get("group_by", "module"),
+        module=args.get("module"),
+        subsystem=args.get("subsystem"),
+    )
 
-    elif name == "ue_save_batch":
-        return db.save_batch(args["items"])
 
-    return {"error": f"Unknown tool: {name}"}
+def _handle_log_analysis(db: KnowledgeDB, args: dict):
+    return db.log_analysis(**args)
+
+
+def _handle_save_batch(db: KnowledgeDB, args: dict):
+    return db.save_batch(args["items"])
+
+
+# Tool name -> handler. One dict lookup per call instead of walking an if/elif chain.
+_HANDLERS = {
+    "ue_save": _handle_save,
+    "ue_search": _handle_search,
+    "ue_get": _handle_get,
+    "ue_list": _handle_list,
+    "ue_update": _handle_update,
+    "ue_delete": _handle_delete,
+    "ue_stats": _handle_stats,
+    "ue_save_class": _handle_save_class,
+    "ue_save_function": _handle_save_function,
+    "ue_save_property": _handle_save_property,
+    "ue_query_class": _handle_query_class,
+    "ue_query_hierarchy": _handle_query_hierarchy,
+    "ue_query_calls": _handle_query_calls,
+    "ue_analysis_status": _handle_analysis_status,
+    "ue_log_analysis": _handle_log_analysis,
+    "ue_save_batch": _handle_save_batch,
+}
+
+
+def _handle(db: KnowledgeDB, name: str, args: dict):
+    handler = _HANDLERS.get(name)
+    if handler is None:
+        return {"error": f"Unknown tool: {name}"}
+    return handler(db, args)
 
 
 async def main():
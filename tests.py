@@ -1,87 +1,152 @@
 """Tests for UE Knowledge Base MCP server."""
 
+import importlib.util
 import json
-import sqlite3
+import sys
 import tempfile
 import unittest
+from datetime import datetime, timezone
 from pathlib import Path
+from types import MappingProxyType
 from unittest.mock import patch
 
 from server import (
     KnowledgeDB,
+    LIST_COLUMNS,
     VALID_SUBSYSTEMS,
     VALID_CATEGORIES,
     VALID_KINDS,
-    DEPTH_ORDER,
     MIGRATIONS,
+    TOOLS,
+    _HANDLERS,
     _handle,
     _safe_json_loads,
-    SCHEMA,
 )
 
 
-class TestSchema(unittest.TestCase):
-    """Database schema: tables, indexes, triggers, pragmas."""
+# Schema objects the migrated DB must contain (triggers: exactly these)
+_EXPECTED_TABLES = frozenset({
+    "entries", "entries_fts", "classes", "classes_fts",
+    "functions", "functions_fts", "properties", "properties_fts",
+    "analysis_log", "schema_version",
+})
+_EXPECTED_INDEXES = frozenset({
+    "idx_entries_subsystem", "idx_entries_category", "idx_entries_list",
+    "idx_entries_title",
+    "idx_classes_name", "idx_classes_parent", "idx_classes_subsystem",
+    "idx_classes_module", "idx_classes_kind", "idx_classes_depth",
+    "idx_classes_entry_id",
+    "idx_functions_class", "idx_functions_subsystem", "idx_functions_name",
+    "idx_functions_qualified", "idx_functions_entry_id",
+    "idx_properties_class", "idx_properties_subsystem", "idx_properties_qualified",
+    "idx_properties_entry_id",
+    "idx_analysis_file", "idx_analysis_module",
+})
+_EXPECTED_TRIGGERS = frozenset({
+    "entries_ai", "entries_au", "entries_ad",
+    "entries_count_ai", "entries_count_ad",
+    "classes_ai", "classes_au", "classes_ad",
+    "functions_ai", "functions_au", "functions_ad",
+    "properties_ai", "properties_au", "properties_ad",
+    "classes_count_ai", "classes_count_ad",
+    "functions_count_ai", "functions_count_ad",
+    "properties_count_ai", "properties_count_ad",
+    "analysis_log_count_ai", "analysis_log_count_ad",
+})
+
+
+_ENTRY_FIELDS = ("title", "subsystem", "category", "summary", "content", "tags")
+
+
+def _seed_entries(db, *rows):
+    """Insert (title, subsystem, category, summary, content[, tags]) rows
+    with one save_many."""
+    result = db.save_many([dict(zip(_ENTRY_FIELDS, row)) for row in rows])
+    assert not result["errors"], result["errors"]
+
+
+def _server_without_orjson():
+    """A separate copy of server.py imported as if orjson were not installed."""
+    spec = importlib.util.spec_from_file_location(
+        "server_stdlib_json", Path(__file__).with_name("server.py"))
+    module = importlib.util.module_from_spec(spec)
+    with patch.dict(sys.modules, {"orjson": None}):
+        spec.loader.exec_module(module)
+    return module
+
+
+_template = None
+
+
+def _template_db():
+    """Empty, fully migrated DB built once per process and cloned per test."""
+    global _template
+    if _template is None:
+        _template = KnowledgeDB(":memory:")
+    return _template
+
+
+class _DBTestCase(unittest.TestCase):
+    """Base class with setUp/tearDown for a private in-memory DB. A subclass
+    defining a seed(db) classmethod has its fixture rows written once, into a
+    class-level template that every test then clones."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.template = _template_db()
+        seed = getattr(cls, "seed", None)
+        if seed is not None:
+            cls.template = KnowledgeDB(":memory:", template=cls.template)
+            seed(cls.template)
+            # Planner statistics for the seeded rows, as production keeps via
+            # ANALYZE/PRAGMA optimize; clones inherit sqlite_stat1
+            cls.template.conn.execute("ANALYZE")
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.template is not _template_db():
+            cls.template.close()
+        super().tearDownClass()
 
     def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
+        self.db = KnowledgeDB(":memory:", template=self.template)
 
     def tearDown(self):
         self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
 
-    def test_wal_mode(self):
-        mode = self.db.conn.execute("PRAGMA journal_mode").fetchone()[0]
-        self.assertEqual(mode, "wal")
+
+class TestSchema(_DBTestCase):
+    """Database schema: tables, indexes, triggers, pragmas."""
+
+    def test_connection_pragmas(self):
+        conn = self.db.conn
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+        self.assertEqual(conn.execute("PRAGMA temp_store").fetchone()[0], 2)  # MEMORY
+        self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -65536)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # One sqlite_master pass, partitioned by type, shared by the catalog tests
+        cls.catalog = {"table": set(), "index": set(), "trigger": set()}
+        for kind, name in _template_db().conn.execute(
+            "SELECT type, name FROM sqlite_master WHERE type IN ('table', 'index', 'trigger')"
+        ):
+            cls.catalog[kind].add(name)
 
     def test_tables_exist(self):
-        tables = {
-            r[0]
-            for r in self.db.conn.execute(
-                "SELECT name FROM sqlite_master WHERE type='table'"
-            ).fetchall()
-        }
-        for t in ("entries", "entries_fts", "classes", "classes_fts",
-                   "functions", "functions_fts", "properties", "properties_fts",
-                   "analysis_log", "schema_version"):
-            self.assertIn(t, tables)
+        self.assertEqual(_EXPECTED_TABLES - self.catalog["table"], set())
 
     def test_indexes_exist(self):
-        indexes = {
-            r[0]
-            for r in self.db.conn.execute(
-                "SELECT name FROM sqlite_master WHERE type='index'"
-            ).fetchall()
-        }
-        expected = {
-            "idx_entries_subsystem", "idx_entries_category", "idx_entries_updated",
-            "idx_classes_name", "idx_classes_parent", "idx_classes_subsystem",
-            "idx_classes_module", "idx_classes_kind", "idx_classes_depth",
-            "idx_classes_entry_id",
-            "idx_functions_class", "idx_functions_subsystem", "idx_functions_name",
-            "idx_functions_qualified", "idx_functions_entry_id",
-            "idx_properties_class", "idx_properties_subsystem", "idx_properties_qualified",
-            "idx_properties_entry_id",
-            "idx_analysis_file", "idx_analysis_module",
-        }
-        for idx in expected:
-            self.assertIn(idx, indexes)
+        self.assertEqual(_EXPECTED_INDEXES - self.catalog["index"], set())
 
     def test_triggers_exist(self):
-        triggers = {
-            r[0]
-            for r in self.db.conn.execute(
-                "SELECT name FROM sqlite_master WHERE type='trigger'"
-            ).fetchall()
-        }
-        expected = {"entries_ai", "entries_au", "entries_ad",
-                     "classes_ai", "classes_au", "classes_ad",
-                     "functions_ai", "functions_au", "functions_ad",
-                     "properties_ai", "properties_au", "properties_ad"}
-        self.assertEqual(triggers, expected)
+        self.assertEqual(self.catalog["trigger"], _EXPECTED_TRIGGERS)
+
+    def test_close_twice_is_harmless(self):
+        self.db.close()
+        self.db.close()
 
     def test_empty_db_stats(self):
         stats = self.db.stats()
@@ -94,18 +159,74 @@ class TestSchema(unittest.TestCase):
         self.assertEqual(stats["structured"]["files_analyzed"], 0)
 
 
-class TestSave(unittest.TestCase):
-    """Saving entries: normal flow, validation, duplicates."""
+class TestFileDB(unittest.TestCase):
+    """Behaviour that needs a real database file: WAL, multiple connections."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # One directory per class; removing it also takes any -wal/-shm files
+        cls._tmpdir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._tmpdir.cleanup()
+        super().tearDownClass()
 
     def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
+        self.path = Path(self._tmpdir.name) / f"{self._testMethodName}.db"
+        with patch("server.DB_PATH", self.path):
             self.db = KnowledgeDB()
 
     def tearDown(self):
         self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
+
+    def test_wal_mode(self):
+        mode = self.db.conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(mode, "wal")
+
+    def test_default_path_is_db_path(self):
+        self.assertEqual(Path(self.db.conn.execute("PRAGMA database_list").fetchone()[2]),
+                         self.path.resolve())
+
+    def test_search_cache_invalidated_by_other_connection(self):
+        self.db.search("Zebra")
+        other = KnowledgeDB(self.path)
+        other.save("Zebra notes", "core", "gotcha", "s", "c")
+        other.close()
+        results, total = self.db.search("Zebra")
+        self.assertEqual(total, 1)
+
+
+    def test_save_class_when_other_connection_commits_mid_save(self):
+        other = KnowledgeDB(self.path)
+        self.addCleanup(other.close)
+        self.db.save_class(name="AActor", kind="class", subsystem="gameplay",
+                           module="Engine", header_path="Actor.h")
+
+        def commit_from_other(sql):
+            # Once, as this connection's first write statement of the save starts
+            if "INSERT INTO classes" in sql and not fired:
+                fired.append(sql)
+                other.save_class(name="AActor", kind="class", subsystem="gameplay",
+                                 module="Engine", header_path="Actor.h", summary="From other")
+
+        fired = []
+        self.db.conn.set_trace_callback(commit_from_other)
+        try:
+            result = self.db.save_class(name="AActor", kind="class", subsystem="gameplay",
+                                        module="Engine", header_path="Actor.h", summary="Mine")
+        finally:
+            self.db.conn.set_trace_callback(None)
+        self.assertTrue(fired)
+        self.assertEqual(result["action"], "updated")
+        self.assertFalse(self.db.conn.in_transaction)
+        self.assertEqual(self.db.get_class("AActor")["summary"], "Mine")
+        self.assertIsInstance(self.db.save("After", "core", "class", "s", "c"), int)
+
+
+class TestSave(_DBTestCase):
+    """Saving entries: normal flow, validation, duplicates."""
 
     def _save_sample(self, title="AActor lifecycle", **overrides):
         defaults = dict(
@@ -134,10 +255,10 @@ class TestSave(unittest.TestCase):
             tags=["actor", "lifecycle"],
             related_entries=[],
         )
-        entry = self.db.get(entry_id)
-        self.assertEqual(json.loads(entry["tags"]), ["actor", "lifecycle"])
+        entry = self.db.get_decoded(entry_id)
+        self.assertEqual(entry["tags"], ["actor", "lifecycle"])
         self.assertEqual(
-            json.loads(entry["source_files"]),
+            entry["source_files"],
             ["Engine/Source/Runtime/Engine/Classes/GameFramework/Actor.h"],
         )
 
@@ -159,14 +280,20 @@ class TestSave(unittest.TestCase):
         self.assertIn("Invalid category", str(ctx.exception))
 
     def test_save_all_valid_subsystems(self):
-        for i, sub in enumerate(VALID_SUBSYSTEMS):
-            result = self._save_sample(title=f"Entry {sub}", subsystem=sub)
-            self.assertIsInstance(result, int)
+        result = self.db.save_many([
+            {"title": f"Entry {sub}", "subsystem": sub, "category": "class",
+             "summary": "s", "content": "c"}
+            for sub in VALID_SUBSYSTEMS
+        ])
+        self.assertEqual(result, {"saved": len(VALID_SUBSYSTEMS), "errors": []})
 
     def test_save_all_valid_categories(self):
-        for cat in VALID_CATEGORIES:
-            result = self._save_sample(title=f"Entry {cat}", category=cat)
-            self.assertIsInstance(result, int)
+        result = self.db.save_many([
+            {"title": f"Entry {cat}", "subsystem": "gameplay", "category": cat,
+             "summary": "s", "content": "c"}
+            for cat in VALID_CATEGORIES
+        ])
+        self.assertEqual(result, {"saved": len(VALID_CATEGORIES), "errors": []})
 
     def test_duplicate_title_rejected(self):
         self._save_sample("Duplicate Title")
@@ -181,18 +308,46 @@ class TestSave(unittest.TestCase):
         self.assertIsInstance(result, int)
 
 
-class TestGet(unittest.TestCase):
-    """Getting entries by ID."""
+class TestSaveMany(_DBTestCase):
+    """Bulk entry saves in one transaction."""
+
+    def test_save_many_inserts_and_indexes(self):
+        result = self.db.save_many([
+            {"title": "A", "subsystem": "core", "category": "class", "summary": "s",
+             "content": "alpha", "tags": ["X"]},
+            {"title": "B", "subsystem": "core", "category": "class", "summary": "s",
+             "content": "beta"},
+        ])
+        self.assertEqual(result, {"saved": 2, "errors": []})
+        results, _ = self.db.search("beta")
+        self.assertEqual(results[0]["title"], "B")
+        self.assertEqual(self.db.get_decoded(results[0]["id"] - 1)["tags"], ["x"])
+
+    def test_save_many_reports_bad_and_duplicate_entries(self):
+        self.db.save("A", "core", "class", "s", "c")
+        result = self.db.save_many([
+            {"title": "A", "subsystem": "core", "category": "class", "summary": "s", "content": "c"},
+            {"title": "B", "subsystem": "bad", "category": "class", "summary": "s", "content": "c"},
+            {"title": "C", "subsystem": "core", "category": "class", "summary": "s", "content": "c"},
+            {"title": "C", "subsystem": "core", "category": "class", "summary": "s", "content": "c"},
+        ])
+        self.assertEqual(result["saved"], 1)
+        self.assertEqual([e["index"] for e in result["errors"]], [0, 1, 3])
+
+    def test_save_many_reports_stored_title_by_index(self):
+        self.db.save("Stored", "core", "class", "s", "c")
+        result = self.db.save_many([
+            {"title": "New", "subsystem": "core", "category": "class", "summary": "s", "content": "c"},
+            {"title": "Stored", "subsystem": "core", "category": "class", "summary": "s", "content": "c"},
+        ])
+        self.assertEqual(result, {
+            "saved": 1, "errors": [{"index": 1, "error": "Duplicate title: 'Stored'"}],
+        })
+        self.assertEqual(self.db.stats()["total"], 2)
 
-    def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
 
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
+class TestGet(_DBTestCase):
+    """Getting entries by ID."""
 
     def test_get_existing(self):
         entry_id = self.db.save("Test", "core", "class", "s", "c")
@@ -204,6 +359,12 @@ class TestGet(unittest.TestCase):
     def test_get_nonexistent(self):
         self.assertIsNone(self.db.get(9999))
 
+    def test_get_decoded(self):
+        entry_id = self.db.save("Test", "core", "class", "s", "c", tags=["a"])
+        entry = self.db.get_decoded(entry_id)
+        self.assertEqual((entry["tags"], entry["source_files"]), (["a"], []))
+        self.assertIsNone(self.db.get_decoded(9999))
+
     def test_get_returns_all_fields(self):
         entry_id = self.db.save("Test", "core", "class", "sum", "content")
         entry = self.db.get(entry_id)
@@ -214,22 +375,19 @@ class TestGet(unittest.TestCase):
         self.assertEqual(set(entry.keys()), expected_keys)
 
 
-class TestSearch(unittest.TestCase):
+class TestSearch(_DBTestCase):
     """FTS5 full-text search."""
 
-    def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
-        self.db.save("AActor lifecycle", "gameplay", "class", "Actor lifecycle hooks.", "BeginPlay Tick EndPlay")
-        self.db.save("APawn movement", "gameplay", "class", "Pawn movement component.", "AddMovementInput")
-        self.db.save("UPROPERTY specifiers", "core", "macro", "Property macro specifiers.", "EditAnywhere BlueprintReadWrite Replicated")
-        self.db.save("Replication overview", "networking", "architecture", "How replication works.", "DOREPLIFETIME GetLifetimeReplicatedProps")
+    SEED = (
+        ("AActor lifecycle", "gameplay", "class", "Actor lifecycle hooks.", "BeginPlay Tick EndPlay"),
+        ("APawn movement", "gameplay", "class", "Pawn movement component.", "AddMovementInput"),
+        ("UPROPERTY specifiers", "core", "macro", "Property macro specifiers.", "EditAnywhere BlueprintReadWrite Replicated"),
+        ("Replication overview", "networking", "architecture", "How replication works.", "DOREPLIFETIME GetLifetimeReplicatedProps"),
+    )
 
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
+    @classmethod
+    def seed(cls, db):
+        _seed_entries(db, *cls.SEED)
 
     def test_search_finds_match(self):
         results, total = self.db.search("lifecycle")
@@ -286,22 +444,35 @@ class TestSearch(unittest.TestCase):
         self.assertEqual(results, [])
         self.assertEqual(total, 0)
 
+    def test_search_cached_results_are_copies(self):
+        results, _ = self.db.search("lifecycle")
+        results[0]["title"] = "mutated"
+        again, _ = self.db.search("lifecycle")
+        self.assertEqual(again[0]["title"], "AActor lifecycle")
+
+    def test_seeded_clone_has_planner_statistics(self):
+        tables = {r[0] for r in self.db.conn.execute("SELECT tbl FROM sqlite_stat1")}
+        self.assertIn("entries", tables)
+
+    def test_search_cache_invalidated_by_own_write(self):
+        self.db.search("Zebra")
+        self.db.save("Zebra notes", "core", "gotcha", "s", "c")
+        results, total = self.db.search("Zebra")
+        self.assertEqual(total, 1)
 
-class TestList(unittest.TestCase):
+
+class TestList(_DBTestCase):
     """Listing entries with filters."""
 
-    def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
-        self.db.save("A", "gameplay", "class", "s", "c")
-        self.db.save("B", "gameplay", "gotcha", "s", "c")
-        self.db.save("C", "core", "class", "s", "c")
+    SEED = (
+        ("A", "gameplay", "class", "s", "c"),
+        ("B", "gameplay", "gotcha", "s", "c"),
+        ("C", "core", "class", "s", "c"),
+    )
 
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
+    @classmethod
+    def seed(cls, db):
+        _seed_entries(db, *cls.SEED)
 
     def test_list_all(self):
         entries, total = self.db.list_entries()
@@ -337,30 +508,44 @@ class TestList(unittest.TestCase):
         dates = [e["updated_at"] for e in entries]
         self.assertEqual(dates, sorted(dates, reverse=True))
 
+    def test_list_total_tracks_deletes(self):
+        entries, _ = self.db.list_entries()
+        self.db.delete(entries[0]["id"])
+        _, total = self.db.list_entries()
+        self.assertEqual(total, 2)
+
+    def test_list_filtered_total_past_last_page(self):
+        entries, total = self.db.list_entries(subsystem="gameplay", offset=5)
+        self.assertEqual(entries, [])
+        self.assertEqual(total, 2)
+
+    def test_list_filtered_rows_have_entry_columns_only(self):
+        entries, _ = self.db.list_entries(subsystem="gameplay")
+        self.assertNotIn("total_matches", entries[0])
+
     def test_list_empty_filter(self):
         entries, total = self.db.list_entries(subsystem="networking")
         self.assertEqual(entries, [])
         self.assertEqual(total, 0)
 
 
-class TestUpdate(unittest.TestCase):
+class TestUpdate(_DBTestCase):
     """Updating entries."""
 
     def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
+        super().setUp()
         self.entry_id = self.db.save("Original", "core", "class", "s", "c")
 
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
-
     def test_update_title(self):
         self.assertTrue(self.db.update(self.entry_id, title="Updated"))
         self.assertEqual(self.db.get(self.entry_id)["title"], "Updated")
 
+    def test_update_to_existing_title_rejected(self):
+        self.db.save("Other", "core", "class", "s", "c")
+        with self.assertRaises(ValueError):
+            self.db.update(self.entry_id, title="Other")
+        self.assertEqual(self.db.get(self.entry_id)["title"], "Original")
+
     def test_update_summary(self):
         self.assertTrue(self.db.update(self.entry_id, summary="New summary"))
         self.assertEqual(self.db.get(self.entry_id)["summary"], "New summary")
@@ -375,8 +560,8 @@ class TestUpdate(unittest.TestCase):
 
     def test_update_tags_list(self):
         self.assertTrue(self.db.update(self.entry_id, tags=["a", "b"]))
-        entry = self.db.get(self.entry_id)
-        self.assertEqual(json.loads(entry["tags"]), ["a", "b"])
+        entry = self.db.get_decoded(self.entry_id)
+        self.assertEqual(entry["tags"], ["a", "b"])
 
     def test_update_bumps_updated_at(self):
         before = self.db.get(self.entry_id)["updated_at"]
@@ -408,20 +593,13 @@ class TestUpdate(unittest.TestCase):
         self.assertEqual(results[0]["id"], self.entry_id)
 
 
-class TestDelete(unittest.TestCase):
+class TestDelete(_DBTestCase):
     """Deleting entries."""
 
     def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
+        super().setUp()
         self.entry_id = self.db.save("ToDelete", "core", "class", "s", "c")
 
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
-
     def test_delete_existing(self):
         self.assertTrue(self.db.delete(self.entry_id))
         self.assertIsNone(self.db.get(self.entry_id))
@@ -440,20 +618,13 @@ class TestDelete(unittest.TestCase):
         self.assertEqual(self.db.stats()["total"], 0)
 
 
-class TestHandle(unittest.TestCase):
-    """MCP _handle dispatcher: args safety, routing, error handling."""
+class TestHandle(_DBTestCase):
+    """MCP _handle dispatcher: tools that write."""
 
     def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
+        super().setUp()
         self.entry_id = self.db.save("HandleTest", "core", "class", "s", "c")
 
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
-
     def test_handle_save(self):
         result = _handle(self.db, "ue_save", {
             "title": "New Entry",
@@ -465,6 +636,41 @@ class TestHandle(unittest.TestCase):
         self.assertTrue(result["saved"])
         self.assertIn("id", result)
 
+    def test_handle_update_does_not_mutate_args(self):
+        # A read-only mapping makes any mutation raise instead of needing a copy to compare
+        args = MappingProxyType({"id": self.entry_id, "summary": "Updated"})
+        result = _handle(self.db, "ue_update", args)
+        self.assertTrue(result["updated"])
+
+    def test_handle_delete(self):
+        result = _handle(self.db, "ue_delete", {"id": self.entry_id})
+        self.assertTrue(result["deleted"])
+
+    def test_handle_save_duplicate_via_handle(self):
+        result = _handle(self.db, "ue_save", {
+            "title": "HandleTest",
+            "subsystem": "core",
+            "category": "class",
+            "summary": "Dup",
+            "content": "Dup",
+        })
+        self.assertTrue(result.get("duplicate"))
+
+
+class TestHandleReadOnly(unittest.TestCase):
+    """MCP _handle dispatcher: routing and read-only tools, sharing one DB."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.db = KnowledgeDB(":memory:", template=_template_db())
+        cls.entry_id = cls.db.save("HandleTest", "core", "class", "s", "c")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.db.close()
+        super().tearDownClass()
+
     def test_handle_search(self):
         result = _handle(self.db, "ue_search", {"query": "HandleTest"})
         self.assertIn("results", result)
@@ -487,16 +693,6 @@ class TestHandle(unittest.TestCase):
         self.assertIn("count", result)
         self.assertIn("total_matches", result)
 
-    def test_handle_update_does_not_mutate_args(self):
-        args = {"id": self.entry_id, "summary": "Updated"}
-        args_copy = dict(args)
-        _handle(self.db, "ue_update", args)
-        self.assertEqual(args, args_copy)
-
-    def test_handle_delete(self):
-        result = _handle(self.db, "ue_delete", {"id": self.entry_id})
-        self.assertTrue(result["deleted"])
-
     def test_handle_stats(self):
         result = _handle(self.db, "ue_stats", {})
         self.assertIn("total", result)
@@ -507,32 +703,22 @@ class TestHandle(unittest.TestCase):
         result = _handle(self.db, "ue_nonexistent", {})
         self.assertIn("error", result)
 
-    def test_handle_save_duplicate_via_handle(self):
-        result = _handle(self.db, "ue_save", {
-            "title": "HandleTest",
-            "subsystem": "core",
-            "category": "class",
-            "summary": "Dup",
-            "content": "Dup",
-        })
-        self.assertTrue(result.get("duplicate"))
+    def test_every_tool_has_handler(self):
+        self.assertEqual({t.name for t in TOOLS}, set(_HANDLERS))
 
 
-class TestStats(unittest.TestCase):
+class TestStats(_DBTestCase):
     """Statistics accuracy."""
 
-    def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
-        self.db.save("A", "gameplay", "class", "s", "c")
-        self.db.save("B", "gameplay", "gotcha", "s", "c")
-        self.db.save("C", "core", "macro", "s", "c")
+    SEED = (
+        ("A", "gameplay", "class", "s", "c"),
+        ("B", "gameplay", "gotcha", "s", "c"),
+        ("C", "core", "macro", "s", "c"),
+    )
 
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
+    @classmethod
+    def seed(cls, db):
+        _seed_entries(db, *cls.SEED)
 
     def test_total(self):
         self.assertEqual(self.db.stats()["total"], 3)
@@ -552,20 +738,6 @@ class TestStats(unittest.TestCase):
 # ── Structured code table tests ───────────────────────────────────────────────
 
 
-class _DBTestCase(unittest.TestCase):
-    """Base class with setUp/tearDown for temp DB."""
-
-    def setUp(self):
-        self.tmp = tempfile.NamedTemporaryFile(suffix=".db", delete=False)
-        self.tmp.close()
-        with patch("server.DB_PATH", Path(self.tmp.name)):
-            self.db = KnowledgeDB()
-
-    def tearDown(self):
-        self.db.close()
-        Path(self.tmp.name).unlink(missing_ok=True)
-
-
 class TestSaveClass(_DBTestCase):
     """Saving classes: create, upsert/merge, validation."""
 
@@ -601,6 +773,40 @@ class TestSaveClass(_DBTestCase):
         cls = self.db.get_class("AActor")
         self.assertEqual(cls["summary"], "Updated summary")
 
+    def test_identical_resave_writes_nothing(self):
+        first = self._save_actor(summary="Base actor", key_methods=["BeginPlay"])
+        before = self.db.get_class("AActor")["updated_at"]
+        changes = self.db.conn.total_changes
+        result = self._save_actor(summary="Base actor", key_methods=["BeginPlay"])
+        self.assertEqual(result["action"], "unchanged")
+        self.assertEqual(result["id"], first["id"])
+        self.assertEqual(self.db.conn.total_changes, changes)
+        self.assertEqual(self.db.get_class("AActor")["updated_at"], before)
+
+    def test_stdlib_json_fallback_writes_same_text(self):
+        stdlib = _server_without_orjson()
+        self.assertIsNone(stdlib.orjson)
+        fallback_db = stdlib.KnowledgeDB(":memory:")
+        self.addCleanup(fallback_db.close)
+        args = dict(name="AActor", kind="class", subsystem="gameplay", module="Engine",
+                    header_path="Actor.h", key_methods=["Tick", "BeginPlay", "Größe"])
+        fallback_db.save_class(**args)
+        stored = fallback_db.conn.execute("SELECT key_methods FROM classes").fetchone()[0]
+        self.assertEqual(stored, '["Tick","BeginPlay","Größe"]')
+        # Re-saved through this module's serializer (orjson when installed)
+        clone = KnowledgeDB(":memory:", template=fallback_db)
+        self.addCleanup(clone.close)
+        self.assertEqual(clone.save_class(**args)["action"], "unchanged")
+
+    def test_upsert_keeps_unsupplied_fields(self):
+        self._save_actor(summary="Base actor", parent_class="UObject", source_line_count=120)
+        self._save_actor(module="EngineRenamed")
+        cls = self.db.get_class("AActor")
+        self.assertEqual(cls["summary"], "Base actor")
+        self.assertEqual(cls["parent_class"], "UObject")
+        self.assertEqual(cls["source_line_count"], 120)
+        self.assertEqual(cls["module"], "EngineRenamed")
+
     def test_upsert_merges_arrays(self):
         self._save_actor(known_children=["APawn"])
         self._save_actor(known_children=["AInfo", "APawn"])
@@ -636,12 +842,14 @@ class TestSaveClass(_DBTestCase):
         self.assertIn("Invalid subsystem", str(ctx.exception))
 
     def test_all_valid_kinds(self):
-        for kind in VALID_KINDS:
-            result = self.db.save_class(
-                name=f"Test{kind}", kind=kind, subsystem="core",
-                module="Core", header_path="test.h",
-            )
-            self.assertTrue(result["upserted"])
+        result = self.db.save_batch([
+            {"type": "class", "name": f"Test{kind}", "kind": kind, "subsystem": "core",
+             "module": "Core", "header_path": "test.h"}
+            for kind in VALID_KINDS
+        ])
+        self.assertEqual(result["errors"], [])
+        self.assertEqual(result["saved"], len(VALID_KINDS))
+        self.assertTrue(all(r["upserted"] for r in result["results"]))
 
     def test_json_arrays_deserialized_on_get(self):
         self._save_actor(
@@ -672,6 +880,19 @@ class TestSaveClass(_DBTestCase):
         self.assertEqual(stats["structured"]["classes"], 1)
         self.assertIn("stub", stats["structured"]["by_depth"])
 
+    def test_stats_class_count_ignores_resave(self):
+        self._save_actor()
+        self._save_actor(summary="Updated")
+        self.assertEqual(self.db.stats()["structured"]["classes"], 1)
+
+    def test_resave_keeps_fts_consistent(self):
+        self._save_actor(summary="Base actor")
+        self._save_actor(summary="Base actor")
+        self.db.conn.execute("INSERT INTO classes_fts(classes_fts) VALUES('integrity-check')")
+        self._save_actor(summary="Placeable world object")
+        result = self.db.search_all("placeable", tables=["classes"])
+        self.assertEqual(result["classes"][0]["name"], "AActor")
+
 
 class TestSaveFunction(_DBTestCase):
     """Saving functions: create, upsert, validation."""
@@ -696,6 +917,12 @@ class TestSaveFunction(_DBTestCase):
         result = self._save_beginplay(summary="Updated desc")
         self.assertEqual(result["action"], "updated")
 
+    def test_identical_resave_is_unchanged(self):
+        first = self._save_beginplay()
+        result = self._save_beginplay()
+        self.assertEqual(result["action"], "unchanged")
+        self.assertEqual(result["id"], first["id"])
+
     def test_qualified_name_auto(self):
         result = self._save_beginplay()
         self.assertEqual(result["qualified_name"], "AActor::BeginPlay")
@@ -711,7 +938,7 @@ class TestSaveFunction(_DBTestCase):
     def test_parameters_stored(self):
         self._save_beginplay(parameters=[{"name": "DeltaTime", "type": "float"}])
         row = self.db.conn.execute(
-            "SELECT parameters FROM functions WHERE qualified_name = 'AActor::BeginPlay'"
+            "SELECT parameters FROM functions WHERE qualified_name = ?", ("AActor::BeginPlay",)
         ).fetchone()
         params = json.loads(row[0])
         self.assertEqual(params[0]["name"], "DeltaTime")
@@ -722,7 +949,7 @@ class TestSaveFunction(_DBTestCase):
             rpc_type="Server",
         )
         row = self.db.conn.execute(
-            "SELECT is_virtual, is_blueprint_callable, is_rpc, rpc_type FROM functions WHERE qualified_name = 'AActor::BeginPlay'"
+            "SELECT is_virtual, is_blueprint_callable, is_rpc, rpc_type FROM functions WHERE qualified_name = ?", ("AActor::BeginPlay",)
         ).fetchone()
         self.assertEqual(row[0], 1)  # is_virtual
         self.assertEqual(row[1], 1)  # is_blueprint_callable
@@ -735,7 +962,7 @@ class TestSaveFunction(_DBTestCase):
             called_by=["UWorld::BeginPlay"],
         )
         row = self.db.conn.execute(
-            "SELECT calls_into, called_by FROM functions WHERE qualified_name = 'AActor::BeginPlay'"
+            "SELECT calls_into, called_by FROM functions WHERE qualified_name = ?", ("AActor::BeginPlay",)
         ).fetchone()
         self.assertIn("PostInitializeComponents", row[0])
         self.assertIn("UWorld::BeginPlay", row[1])
@@ -779,7 +1006,7 @@ class TestSaveProperty(_DBTestCase):
             replicated_using="OnRep_RootComponent",
         )
         row = self.db.conn.execute(
-            "SELECT is_replicated, replicated_using FROM properties WHERE qualified_name = 'AActor::RootComponent'"
+            "SELECT is_replicated, replicated_using FROM properties WHERE qualified_name = ?", ("AActor::RootComponent",)
         ).fetchone()
         self.assertEqual(row[0], 1)
         self.assertEqual(row[1], "OnRep_RootComponent")
@@ -791,7 +1018,7 @@ class TestSaveProperty(_DBTestCase):
             is_config=False,
         )
         row = self.db.conn.execute(
-            "SELECT is_blueprint_visible, is_edit_anywhere, is_config FROM properties WHERE qualified_name = 'AActor::RootComponent'"
+            "SELECT is_blueprint_visible, is_edit_anywhere, is_config FROM properties WHERE qualified_name = ?", ("AActor::RootComponent",)
         ).fetchone()
         self.assertEqual(row[0], 1)
         self.assertEqual(row[1], 1)
@@ -806,18 +1033,22 @@ class TestSaveProperty(_DBTestCase):
 class TestQueryHierarchy(_DBTestCase):
     """Hierarchy traversal: parents and children."""
 
-    def setUp(self):
-        super().setUp()
-        self.db.save_class(name="UObject", kind="class", subsystem="core",
-                           module="CoreUObject", header_path="UObject/Object.h")
-        self.db.save_class(name="AActor", kind="class", subsystem="gameplay",
-                           module="Engine", header_path="Actor.h", parent_class="UObject")
-        self.db.save_class(name="APawn", kind="class", subsystem="gameplay",
-                           module="Engine", header_path="Pawn.h", parent_class="AActor")
-        self.db.save_class(name="ACharacter", kind="class", subsystem="gameplay",
-                           module="Engine", header_path="Character.h", parent_class="APawn")
-        self.db.save_class(name="AInfo", kind="class", subsystem="gameplay",
-                           module="Engine", header_path="Info.h", parent_class="AActor")
+    # (name, subsystem, module, header_path, parent_class)
+    SEED = (
+        ("UObject", "core", "CoreUObject", "UObject/Object.h", None),
+        ("AActor", "gameplay", "Engine", "Actor.h", "UObject"),
+        ("APawn", "gameplay", "Engine", "Pawn.h", "AActor"),
+        ("ACharacter", "gameplay", "Engine", "Character.h", "APawn"),
+        ("AInfo", "gameplay", "Engine", "Info.h", "AActor"),
+    )
+
+    @classmethod
+    def seed(cls, db):
+        db.save_batch([
+            {"type": "class", "name": name, "kind": "class", "subsystem": subsystem,
+             "module": module, "header_path": header, "parent_class": parent}
+            for name, subsystem, module, header, parent in cls.SEED
+        ])
 
     def test_parents_chain(self):
         result = self.db.query_hierarchy("ACharacter", direction="parents")
@@ -849,6 +1080,16 @@ class TestQueryHierarchy(_DBTestCase):
         self.assertEqual(len(result["parents"]), 1)
         self.assertEqual(result["parents"][0], "APawn")
 
+    def test_parents_stop_at_unsaved_parent_and_bound_cycles(self):
+        self.db.save_class(name="AStub", kind="class", subsystem="core",
+                           module="Core", header_path="s.h", parent_class="UMissing")
+        self.assertEqual(self.db.query_hierarchy("AStub", direction="parents")["parents"], ["UMissing"])
+        self.db.save_class(name="UObject", kind="class", subsystem="core",
+                           module="CoreUObject", header_path="UObject/Object.h", parent_class="AActor")
+        result = self.db.query_hierarchy("AActor", direction="parents", depth=3)
+        self.assertEqual(result["parents"], ["UObject", "AActor", "UObject"])
+        self.assertEqual(self.db.query_hierarchy("AActor", direction="parents", depth=0)["parents"], [])
+
     def test_nested_children_structure(self):
         result = self.db.query_hierarchy("AActor", direction="children")
         # APawn should have ACharacter as child
@@ -856,6 +1097,22 @@ class TestQueryHierarchy(_DBTestCase):
         char_names = [c["name"] for c in pawn["children"]]
         self.assertIn("ACharacter", char_names)
 
+    def test_mapping_children(self):
+        result = self.db.query_hierarchy("AActor", direction="children", shape="mapping")
+        self.assertEqual(result["children"], {"APawn": {"ACharacter": {}}, "AInfo": {}})
+        result = self.db.query_hierarchy("AActor", direction="parents", shape="mapping")
+        self.assertEqual(result["children"], {})
+
+    def test_flat_children(self):
+        result = self.db.query_hierarchy("AActor", direction="children", shape="flat")
+        self.assertEqual(sorted(result["children"]), ["ACharacter", "AInfo", "APawn"])
+        char = result["children"].index("ACharacter")
+        self.assertEqual(result["children"][result["child_parents"][char]], "APawn")
+        self.assertEqual(result["child_depths"][char], 2)
+        result = self.db.query_hierarchy("AActor", direction="parents", shape="flat")
+        self.assertEqual((result["children"], result["child_parents"], result["child_depths"]),
+                         ([], [], []))
+
 
 class TestQueryCalls(_DBTestCase):
     """Call chain queries."""
@@ -895,6 +1152,12 @@ class TestQueryCalls(_DBTestCase):
         result = self.db.query_calls("Nonexistent::Func")
         self.assertIn("error", result)
 
+    def test_query_free_function(self):
+        self.db.save_function(name="GetWorld", subsystem="core", summary="Free helper")
+        result = self.db.query_calls("GetWorld")
+        self.assertEqual(result["function"], "GetWorld")
+        self.assertEqual(result["summary"], "Free helper")
+
 
 class TestQueryClassFull(_DBTestCase):
     """Full class query with linked functions and properties."""
@@ -1024,6 +1287,10 @@ class TestHandleStructured(_DBTestCase):
                 "module": "Engine", "header_path": "Actor.h",
             })
 
+    def test_handle_save_class_missing_required(self):
+        with self.assertRaises(TypeError):
+            _handle(self.db, "ue_save_class", {"name": "AActor", "kind": "class"})
+
     def test_handle_save_function(self):
         result = _handle(self.db, "ue_save_function", {
             "name": "BeginPlay", "subsystem": "gameplay",
@@ -1125,6 +1392,65 @@ class TestSchemaVersion(_DBTestCase):
         """New DB from SCHEMA + migrations should have latest version."""
         self.assertEqual(self.db._current_schema_version(), len(MIGRATIONS))
 
+    def test_title_index_migration_renames_duplicates(self):
+        first = self.db.save("Same", "core", "class", "s", "c")
+        second = self.db.save("Other", "core", "class", "s", "c")
+        conn = self.db.conn
+        conn.execute("DROP INDEX idx_entries_title")
+        conn.execute("DELETE FROM schema_version WHERE version >= 9")
+        conn.execute("UPDATE entries SET title = 'Same' WHERE id = ?", (second,))
+        conn.commit()
+        self.db._run_migrations()
+        self.assertEqual(self.db.get(first)["title"], "Same")
+        self.assertEqual(self.db.get(second)["title"], f"Same ({second})")
+
+    def test_row_count_migration_backfills_existing_rows(self):
+        conn = self.db.conn
+        for tbl in ("classes", "analysis_log"):
+            conn.execute(f"DROP TRIGGER {tbl}_count_ai")
+        conn.execute("DELETE FROM schema_version WHERE version >= 10")
+        conn.commit()
+        self.db.save_class(name="AActor", kind="class", subsystem="core", module="Engine",
+                           header_path="Actor.h")
+        self.db.log_analysis(file_path="A.h", module="M", subsystem="core", analysis_depth="stub")
+        self.db._run_migrations()
+        structured = self.db.stats()["structured"]
+        self.assertEqual(structured["classes"], 1)
+        self.assertEqual(structured["files_analyzed"], 1)
+
+    def test_json_compact_migration_rewrites_spaced_arrays(self):
+        args = dict(name="AActor", kind="class", subsystem="gameplay", module="Engine",
+                    header_path="Actor.h", key_methods=["Tick", "BeginPlay"])
+        self.db.save_class(**args)
+        entry_id = self.db.save("Tagged", "core", "class", "s", "c", tags=["actor", "pawn"])
+        conn = self.db.conn
+        conn.execute("""UPDATE classes SET key_methods = '["Tick", "BeginPlay"]'""")
+        conn.execute("""UPDATE entries SET tags = '["actor", "pawn"]'""")
+        conn.execute("DELETE FROM schema_version WHERE version >= 11")
+        conn.commit()
+        self.db._run_migrations()
+        self.assertEqual(conn.execute("SELECT key_methods FROM classes").fetchone()[0],
+                         '["Tick","BeginPlay"]')
+        self.assertEqual(self.db.get(entry_id)["tags"], '["actor","pawn"]')
+        self.assertEqual(self.db.save_class(**args)["action"], "unchanged")
+
+    def test_template_clone_is_independent_copy(self):
+        self.db.save("Seed", "core", "class", "s", "c")
+        clone = KnowledgeDB(":memory:", template=self.db)
+        try:
+            self.assertEqual(clone._current_schema_version(), len(MIGRATIONS))
+            clone.save("Only in clone", "core", "class", "s", "c")
+            self.assertEqual(clone.stats()["total"], 2)
+            self.assertEqual(self.db.stats()["total"], 1)
+        finally:
+            clone.close()
+
+    def test_planner_statistics_table_created(self):
+        tables = {r[0] for r in self.db.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table'"
+        ).fetchall()}
+        self.assertIn("sqlite_stat1", tables)
+
 
 class TestSafeJsonLoads(unittest.TestCase):
     """_safe_json_loads helper."""
@@ -1182,26 +1508,26 @@ class TestNormalizeTags(_DBTestCase):
 
     def test_save_normalizes_tags(self):
         entry_id = self.db.save("Test", "core", "class", "s", "c", tags=["Actor", "  PAWN  ", "actor"])
-        entry = self.db.get(entry_id)
-        tags = json.loads(entry["tags"])
-        self.assertEqual(tags, ["actor", "pawn"])
+        self.assertEqual(self.db.get_decoded(entry_id)["tags"], ["actor", "pawn"])
 
     def test_update_normalizes_tags(self):
         entry_id = self.db.save("Test", "core", "class", "s", "c")
         self.db.update(entry_id, tags=["Actor", "PAWN", "actor"])
-        entry = self.db.get(entry_id)
-        tags = json.loads(entry["tags"])
-        self.assertEqual(tags, ["actor", "pawn"])
+        self.assertEqual(self.db.get_decoded(entry_id)["tags"], ["actor", "pawn"])
 
 
 class TestSearchWithTags(_DBTestCase):
     """Search with tag filtering."""
 
-    def setUp(self):
-        super().setUp()
-        self.db.save("Actor entry", "gameplay", "class", "s", "c", tags=["actor", "lifecycle"])
-        self.db.save("Pawn entry", "gameplay", "class", "s", "c", tags=["pawn", "actor"])
-        self.db.save("Network entry", "networking", "architecture", "s", "c", tags=["replication"])
+    SEED = (
+        ("Actor entry", "gameplay", "class", "s", "c", ["actor", "lifecycle"]),
+        ("Pawn entry", "gameplay", "class", "s", "c", ["pawn", "actor"]),
+        ("Network entry", "networking", "architecture", "s", "c", ["replication"]),
+    )
+
+    @classmethod
+    def seed(cls, db):
+        _seed_entries(db, *cls.SEED)
 
     def test_search_with_single_tag(self):
         results, _ = self.db.search("entry", tags=["actor"])
@@ -1282,6 +1608,13 @@ class TestSearchAll(_DBTestCase):
         for table in result.values():
             self.assertLessEqual(len(table), 1)
 
+    def test_top_k_matches_full_ranking(self):
+        self.db.save("Actor actor actor", "gameplay", "class", "Actor", "actor actor")
+        top = self.db.search_all("actor", limit=1, tables=["entries"])["entries"]
+        ranked = self.db.search_all("actor", limit=10, subsystem="gameplay", tables=["entries"])["entries"]
+        self.assertEqual(top[0]["id"], ranked[0]["id"])
+        self.assertEqual(top[0]["title"], "Actor actor actor")
+
 
 class TestCascadeDelete(_DBTestCase):
     """Cascade delete: entry deletion nullifies linked structured data."""
@@ -1305,23 +1638,23 @@ class TestCascadeDelete(_DBTestCase):
     def test_delete_nullifies_function_entry_id(self):
         self.db.delete(self.entry_id)
         row = self.db.conn.execute(
-            "SELECT entry_id FROM functions WHERE qualified_name = 'AActor::BeginPlay'"
+            "SELECT entry_id FROM functions WHERE qualified_name = ?", ("AActor::BeginPlay",)
         ).fetchone()
         self.assertIsNone(row["entry_id"])
 
     def test_delete_nullifies_property_entry_id(self):
         self.db.delete(self.entry_id)
         row = self.db.conn.execute(
-            "SELECT entry_id FROM properties WHERE qualified_name = 'AActor::RootComponent'"
+            "SELECT entry_id FROM properties WHERE qualified_name = ?", ("AActor::RootComponent",)
         ).fetchone()
         self.assertIsNone(row["entry_id"])
 
     def test_structured_data_still_exists_after_entry_delete(self):
         self.db.delete(self.entry_id)
         self.assertIsNotNone(self.db.get_class("AActor"))
-        fn = self.db.conn.execute("SELECT * FROM functions WHERE qualified_name = 'AActor::BeginPlay'").fetchone()
+        fn = self.db.conn.execute("SELECT * FROM functions WHERE qualified_name = ?", ("AActor::BeginPlay",)).fetchone()
         self.assertIsNotNone(fn)
-        prop = self.db.conn.execute("SELECT * FROM properties WHERE qualified_name = 'AActor::RootComponent'").fetchone()
+        prop = self.db.conn.execute("SELECT * FROM properties WHERE qualified_name = ?", ("AActor::RootComponent",)).fetchone()
         self.assertIsNotNone(prop)
 
 
@@ -1332,10 +1665,12 @@ class TestBoundedHierarchy(_DBTestCase):
         super().setUp()
         self.db.save_class(name="UObject", kind="class", subsystem="core",
                            module="CoreUObject", header_path="Object.h")
-        # Create many children of UObject
-        for i in range(20):
-            self.db.save_class(name=f"UChild{i}", kind="class", subsystem="core",
-                               module="Core", header_path="Child.h", parent_class="UObject")
+        # Create many children of UObject in one transaction
+        self.db.save_batch([
+            {"type": "class", "name": f"UChild{i}", "kind": "class", "subsystem": "core",
+             "module": "Core", "header_path": "Child.h", "parent_class": "UObject"}
+            for i in range(20)
+        ])
 
     def test_max_children_per_level(self):
         result = self.db.query_hierarchy("UObject", direction="children",
@@ -1361,6 +1696,12 @@ class TestBoundedHierarchy(_DBTestCase):
         })
         self.assertLessEqual(len(result["children"]), 3)
 
+    def test_flat_shape_respects_bounds(self):
+        result = self.db.query_hierarchy("UObject", direction="children",
+                                          max_total=3, shape="flat")
+        self.assertEqual(result["children"], ["UChild0", "UChild1", "UChild2"])
+        self.assertTrue(result["truncated"])
+
 
 class TestBatchSave(_DBTestCase):
     """Batch save: multiple items in one transaction."""
@@ -1376,6 +1717,22 @@ class TestBatchSave(_DBTestCase):
         self.assertEqual(result["saved"], 2)
         self.assertEqual(len(result["errors"]), 0)
 
+    def test_batch_resave_in_same_clock_tick_reports_updated(self):
+        items = [
+            {"type": "class", "name": "AActor", "kind": "class",
+             "subsystem": "gameplay", "module": "Engine", "header_path": "Actor.h"},
+            {"type": "class", "name": "AActor", "kind": "class", "summary": "Base actor",
+             "subsystem": "gameplay", "module": "Engine", "header_path": "Actor.h"},
+            {"type": "function", "name": "BeginPlay", "subsystem": "gameplay", "class_name": "AActor"},
+            {"type": "function", "name": "BeginPlay", "subsystem": "gameplay", "class_name": "AActor",
+             "summary": "Begin play"},
+        ]
+        with patch("server.datetime") as clock:
+            clock.now.return_value = datetime(2024, 1, 1, tzinfo=timezone.utc)
+            result = self.db.save_batch(items)
+        self.assertEqual([r["action"] for r in result["results"]],
+                         ["created", "updated", "created", "updated"])
+
     def test_batch_mixed_types(self):
         items = [
             {"type": "class", "name": "AActor", "kind": "class",
@@ -1502,6 +1859,13 @@ class TestFTSFunctionsProperties(_DBTestCase):
         result = self.db.search_all("USceneComponent", tables=["properties"])
         self.assertGreater(len(result["properties"]), 0)
 
+    def test_unchanged_upsert_keeps_fts_consistent(self):
+        self.db.save_function(name="BeginPlay", subsystem="gameplay", class_name="AActor",
+                              summary="Called when play begins", is_virtual=True)
+        self.db.conn.execute("INSERT INTO functions_fts(functions_fts) VALUES('integrity-check')")
+        result = self.db.search_all("BeginPlay", tables=["functions"])
+        self.assertEqual(len(result["functions"]), 1)
+
     def test_function_fts_updates_on_upsert(self):
         self.db.save_function(name="BeginPlay", subsystem="gameplay",
                               class_name="AActor", summary="Updated: initialization hook")
@@ -1514,14 +1878,31 @@ class TestPagination(_DBTestCase):
 
     def setUp(self):
         super().setUp()
-        for i in range(15):
-            self.db.save(f"Entry {i}", "gameplay", "class", f"Summary {i}", f"content {i}")
+        self.db.save_many([
+            {"title": f"Entry {i}", "subsystem": "gameplay", "category": "class",
+             "summary": f"Summary {i}", "content": f"content {i}"}
+            for i in range(15)
+        ])
 
     def test_search_total_exceeds_limit(self):
         results, total = self.db.search("entry", limit=5)
         self.assertLessEqual(len(results), 5)
         self.assertGreater(total, 5)
 
+    def test_search_total_reused_across_page_sizes(self):
+        _, total = self.db.search("entry", limit=5)
+        statements = []
+        self.db.conn.set_trace_callback(statements.append)
+        try:
+            results, cached = self.db.search("entry", limit=3)
+        finally:
+            self.db.conn.set_trace_callback(None)
+        self.assertEqual((len(results), cached), (3, total))
+        self.assertFalse([sql for sql in statements if "COUNT(*)" in sql])
+        self.db.save("Entry 15", "gameplay", "class", "Summary 15", "content 15")
+        _, fresh = self.db.search("entry", limit=3)
+        self.assertEqual(fresh, total + 1)
+
     def test_list_total_with_limit(self):
         entries, total = self.db.list_entries(limit=5)
         self.assertEqual(len(entries), 5)
@@ -1532,6 +1913,47 @@ class TestPagination(_DBTestCase):
         self.assertEqual(len(entries), 5)
         self.assertEqual(total, 15)
 
+    def test_list_after_continues_page(self):
+        first, _ = self.db.list_entries(limit=5)
+        second, total = self.db.list_entries(limit=5, after=(first[-1]["updated_at"], first[-1]["id"]))
+        by_offset, _ = self.db.list_entries(limit=5, offset=5)
+        self.assertEqual([e["id"] for e in second], [e["id"] for e in by_offset])
+        self.assertEqual(total, 15)
+
+    def test_list_cursor_survives_anchor_edit(self):
+        first = _handle(self.db, "ue_list", {"limit": 5})
+        by_offset, _ = self.db.list_entries(limit=5, offset=5)
+        self.db.update(first["entries"][-1]["id"], summary="Edited between pages")
+        second = _handle(self.db, "ue_list", {"limit": 5, "cursor": first["next_cursor"]})
+        self.assertEqual([e["id"] for e in second["entries"]], [e["id"] for e in by_offset])
+
+    def test_list_cursor_survives_anchor_delete(self):
+        first = _handle(self.db, "ue_list", {"limit": 5})
+        by_offset, _ = self.db.list_entries(limit=5, offset=5)
+        self.db.delete(first["entries"][-1]["id"])
+        second = _handle(self.db, "ue_list", {"limit": 5, "cursor": first["next_cursor"]})
+        self.assertEqual([e["id"] for e in second["entries"]], [e["id"] for e in by_offset])
+
+    def test_list_page_uses_covering_index(self):
+        entries, _ = self.db.list_entries(limit=5)
+        self.assertNotIn("content", entries[0])
+        plan = " ".join(r[3] for r in self.db.conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT {LIST_COLUMNS} FROM entries "
+            "ORDER BY updated_at DESC, id LIMIT 5"))
+        self.assertIn("COVERING INDEX idx_entries_list", plan)
+
+    def test_handle_list_next_cursor(self):
+        first = _handle(self.db, "ue_list", {"limit": 10})
+        rest = _handle(self.db, "ue_list", {"limit": 10, "cursor": first["next_cursor"]})
+        self.assertEqual(rest["count"], 5)
+        self.assertNotIn("next_cursor", rest)
+        ids = [e["id"] for e in first["entries"] + rest["entries"]]
+        self.assertEqual(len(set(ids)), 15)
+
+    def test_handle_list_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            _handle(self.db, "ue_list", {"cursor": "not-a-cursor"})
+
     def test_handle_list_total_matches(self):
         result = _handle(self.db, "ue_list", {"limit": 3})
         self.assertEqual(result["count"], 3)